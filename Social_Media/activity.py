@@ -0,0 +1,356 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .caching import invalidate_post
+from . import counters
+from .feed import fan_out_post, backfill_timeline, remove_from_timeline
+from . import graph
+from .models import Activity, User, Post, Comment
+from .notifications import (
+    notify_like,
+    notify_comment,
+    notify_comment_deleted,
+    notify_follow
+)
+
+logger = logging.getLogger(__name__)
+
+LIKE_CREATED = 'like.created'
+COMMENT_CREATED = 'comment.created'
+COMMENT_DELETED = 'comment.deleted'
+FOLLOW_CREATED = 'follow.created'
+FOLLOW_DELETED = 'follow.deleted'
+POST_CREATED = 'post.created'
+
+
+def get_batch_size():
+    """
+    Return the number of events a worker applies in one transaction.
+    """
+    return getattr(settings, 'ACTIVITY_BATCH_SIZE', 100)
+
+
+def get_max_attempts():
+    """
+    Return how many times a failing event is tried before it is left alone.
+    """
+    return getattr(settings, 'ACTIVITY_MAX_ATTEMPTS', 5)
+
+
+def get_retry_delay():
+    """
+    Return the seconds before a failed event is retried; doubled per attempt.
+    """
+    return getattr(settings, 'ACTIVITY_RETRY_DELAY', 1.0)
+
+
+def get_retention():
+    """
+    Return how long processed events are kept before being pruned.
+    """
+    return timedelta(days=getattr(settings, 'ACTIVITY_RETENTION_DAYS', 7))
+
+
+def get_poll_interval():
+    """
+    Return the seconds a worker sleeps when no event is due.
+    """
+    return getattr(settings, 'ACTIVITY_POLL_INTERVAL', 1.0)
+
+
+handlers = {}
+
+
+def handles(kind):
+    """
+    Register the decorated function as the handler of one kind of event.
+
+    Handlers are called with the batch being applied and the event payload.
+    They run in the worker's transaction, so their database writes commit
+    with the event being marked processed. Writes outside the database go
+    through transaction.on_commit, so a batch that is rolled back and
+    retried one event at a time does not apply them twice.
+    """
+    def decorator(func):
+        handlers[kind] = func
+        return func
+    return decorator
+
+
+class Batch:
+    """
+    The side effects of a batch of events.
+
+    Counter deltas are summed per row and column and applied with one
+    UPDATE each, every touched post has its cache invalidated once, and the
+    timeline of each new follower is backfilled with one query.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.posts = set()
+        self.follows = defaultdict(list)
+
+    def count(self, model, pk, field, delta):
+        self.counters[(model, pk, field)] += delta
+
+    def apply(self, events):
+        for event in events:
+            handlers[event.kind](self, event.payload)
+        for (model, pk, field), delta in self.counters.items():
+            if delta:
+                counters.apply(model, pk, field, delta)
+        for user_id, followed_ids in self.follows.items():
+            backfill_timeline(user_id, followed_ids)
+        for post_id in self.posts:
+            invalidate_post(post_id)
+
+
+@handles(LIKE_CREATED)
+def on_like_created(batch, payload):
+    batch.count(Post, payload['post'], 'num_post_likes', 1)
+    batch.posts.add(payload['post'])
+    # Buffered likes were announced when they were buffered.
+    if not payload.get('buffered'):
+        notify_like(payload['user'], payload['post'], payload['author'])
+
+
+@handles(COMMENT_CREATED)
+def on_comment_created(batch, payload):
+    batch.count(Post, payload['post'], 'num_comments', 1)
+    batch.posts.add(payload['post'])
+    comment = Comment(id=payload['comment'], user_id=payload['user'],
+                      post_id=payload['post'])
+    notify_comment(comment, payload['author'])
+
+
+@handles(COMMENT_DELETED)
+def on_comment_deleted(batch, payload):
+    batch.count(Post, payload['post'], 'num_comments', -1)
+    batch.posts.add(payload['post'])
+    notify_comment_deleted(payload['post'])
+
+
+@handles(FOLLOW_CREATED)
+def on_follow_created(batch, payload):
+    user_id, followed_id = payload['user'], payload['followed']
+    batch.count(User, user_id, 'num_following', 1)
+    batch.count(User, followed_id, 'num_followers', 1)
+    batch.follows[user_id].append(followed_id)
+    transaction.on_commit(lambda: graph.on_follow(user_id, followed_id))
+    notify_follow(user_id, followed_id)
+
+
+@handles(FOLLOW_DELETED)
+def on_follow_deleted(batch, payload):
+    user_id, unfollowed_id = payload['user'], payload['followed']
+    batch.count(User, user_id, 'num_following', -1)
+    batch.count(User, unfollowed_id, 'num_followers', -1)
+    # A follow earlier in the batch must not be backfilled after this.
+    followed_ids = batch.follows.get(user_id, [])
+    while unfollowed_id in followed_ids:
+        followed_ids.remove(unfollowed_id)
+    remove_from_timeline(User(pk=user_id), User(pk=unfollowed_id))
+    transaction.on_commit(lambda: graph.on_unfollow(user_id, unfollowed_id))
+    notify_follow(user_id, unfollowed_id, following=False)
+
+
+@handles(POST_CREATED)
+def on_post_created(batch, payload):
+    post = Post.objects.select_related('user').filter(pk=payload['post']).first()
+    if post is not None:
+        fan_out_post(post)
+
+
+def record(kind, key, **payload):
+    """
+    Append an event to the activity log.
+
+    Call it inside the transaction of the write it describes. The worker is
+    woken once the transaction commits. An event whose `key` was already
+    recorded is ignored, so replaying a write cannot apply its side effects
+    twice.
+    """
+    Activity.objects.bulk_create(
+        [Activity(kind=kind, key=key, payload=payload)], ignore_conflicts=True)
+    transaction.on_commit(get_worker().wake)
+
+
+def record_many(kind, events):
+    """
+    Append one event per (key, payload) pair to the activity log with a
+    single INSERT, like record.
+    """
+    Activity.objects.bulk_create(
+        [Activity(kind=kind, key=key, payload=payload) for key, payload in events],
+        ignore_conflicts=True)
+    transaction.on_commit(get_worker().wake)
+
+
+def _fail(event, error, now):
+    event.attempts += 1
+    event.error = f'{type(error).__name__}: {error}'
+    event.available_at = now + timedelta(
+        seconds=get_retry_delay() * 2 ** (event.attempts - 1))
+    event.save(update_fields=['attempts', 'error', 'available_at'])
+    if event.attempts >= get_max_attempts():
+        logger.error('Giving up on activity %s (%s) after %d attempts: %s',
+                     event.key, event.kind, event.attempts, event.error)
+
+
+def process_batch(batch_size=None):
+    """
+    Apply the side effects of the next batch of due events.
+
+    The whole batch is applied in one savepoint first. If any handler
+    fails, the events are applied one by one instead, so a single bad event
+    is retried later with a growing delay without holding back the others.
+    Rows are locked with SKIP LOCKED where the database supports it, so
+    several workers can drain the log concurrently.
+
+    Returns the number of events taken.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = Activity.objects.filter(
+            processed__isnull=True, available_at__lte=now,
+            attempts__lt=get_max_attempts()).order_by('available_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size or get_batch_size()])
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                Batch().apply(events)
+            done = events
+        except Exception:
+            done = []
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        Batch().apply([event])
+                    done.append(event)
+                except Exception as error:
+                    logger.exception('Activity %s (%s) failed',
+                                     event.key, event.kind)
+                    _fail(event, error, now)
+        Activity.objects.filter(pk__in=[event.pk for event in done]).update(
+            processed=now)
+    return len(events)
+
+
+def prune(now=None):
+    """
+    Delete the events processed more than ACTIVITY_RETENTION_DAYS ago.
+
+    A pruned key no longer guards against replaying its write, so the
+    retention must outlast any retry of a write. Events that were given up
+    on are kept for inspection.
+
+    Returns the number of events deleted.
+    """
+    cutoff = (now or timezone.now()) - get_retention()
+    deleted, _ = Activity.objects.filter(processed__lt=cutoff).delete()
+    return deleted
+
+
+_drain_lock = threading.Lock()
+
+
+def drain():
+    """
+    Process batches until no event is due.
+
+    Databases without SKIP LOCKED (SQLite) drain one thread at a time.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        while process_batch():
+            pass
+        return
+    with _drain_lock:
+        while process_batch():
+            pass
+
+
+class ThreadWorker:
+    """
+    Drains the activity log from a background thread of this process.
+
+    The thread wakes up when a transaction recording an event commits, and
+    every ACTIVITY_POLL_INTERVAL seconds for retries and events recorded by
+    other processes. With ACTIVITY_THREADS set to 0 events are applied
+    inline once their transaction commits, which keeps tests deterministic.
+    """
+
+    def __init__(self):
+        self.threads = getattr(settings, 'ACTIVITY_THREADS', 1)
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for index in range(self.threads):
+            threading.Thread(target=self.run, name=f'activity-{index}',
+                             daemon=True).start()
+
+    def wake(self):
+        if not self.threads:
+            drain()
+            return
+        self.start()
+        self.event.set()
+
+    def run(self):
+        while True:
+            self.event.wait(get_poll_interval())
+            self.event.clear()
+            try:
+                drain()
+            except Exception:
+                logger.exception('Could not process the activity log')
+            finally:
+                close_old_connections()
+
+
+class ProcessWorker:
+    """
+    Leaves the activity log to the process_activity management command,
+    run as a separate process.
+    """
+
+    def wake(self):
+        pass
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """
+    Return the activity worker selected by ACTIVITY_WORKER.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            name = getattr(settings, 'ACTIVITY_WORKER', 'thread')
+            if name == 'thread':
+                _worker = ThreadWorker()
+            elif name == 'process':
+                _worker = ProcessWorker()
+            else:
+                raise ImproperlyConfigured(
+                    f'Unknown activity worker {name!r}; use "thread" or "process".')
+        return _worker
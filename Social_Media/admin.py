@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 import django.db
-from .models import User, Post, Comment, Like,SavedPost
+from .models import User, Post, Comment, Like,SavedPost, Activity
 
 
 admin.site.register(User)
@@ -9,3 +9,4 @@ admin.site.register(Post)
 admin.site.register(Comment)
 admin.site.register(Like)
 admin.site.register(SavedPost)
+admin.site.register(Activity)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SocialMediaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Social_Media'
+
+    def ready(self):
+        from . import metrics, routers, signals  # noqa: F401
@@ -0,0 +1,294 @@
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import user_cache, get_cached_user, acheck_credentials
+from .caching import invalidate_post
+from .likes import should_buffer, buffer_like
+from .notifications import notify_like
+from . import activity
+from .models import User, Post, Comment, Like
+from .pagination import PostPagination, CommentPagination
+from .serializers import (
+    PostSerializer,
+    PostRetrieveUpdateDestroySerializer,
+    CommentSerializer,
+    LikePostSerializer
+)
+
+
+class APIError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+async def aauthenticate(request):
+    """
+    Return the user of the JWT access token sent with the request, or None.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    return await aget_token_user(raw_token)
+
+
+async def aget_token_user(raw_token):
+    """
+    Return the user of a raw JWT access token.
+    """
+    try:
+        token = JWTAuthentication().get_validated_token(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        raise APIError('Given token not valid for any token type', status=401)
+    user = get_cached_user(user_id)
+    if user is not None:
+        return user
+    user = await User.objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id}).afirst()
+    if user is None or not user.is_active:
+        raise APIError('User not found', status=401)
+    user_cache.set(user_id, user)
+    return user
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Base class for the async variants of the API views.
+
+    Every handler runs on the event loop and uses the async ORM, so a slow
+    client does not hold a worker thread. Authentication uses the same JWT
+    access tokens as the synchronous API. Anonymous users may only use the
+    methods listed in `anonymous_methods`. DRF exceptions raised by shared
+    helpers, such as the paginator, are answered with their status code.
+    """
+    anonymous_methods = ('get', 'head', 'options')
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await aauthenticate(request)
+            if request.user is None and \
+                    request.method.lower() not in self.anonymous_methods:
+                raise APIError(
+                    'Authentication credentials were not provided.', status=401)
+            request.json = self.parse_body(request)
+            request.query_params = request.GET
+            return await super().dispatch(request, *args, **kwargs)
+        except APIError as error:
+            return JsonResponse({'detail': error.detail}, status=error.status)
+        except APIException as error:
+            headers = {}
+            if getattr(error, 'wait', None):
+                headers['Retry-After'] = str(math.ceil(error.wait))
+            return JsonResponse({'detail': error.detail},
+                                status=error.status_code, headers=headers)
+        except ObjectDoesNotExist:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    def parse_body(self, request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS', 'DELETE') or not request.body:
+            return {}
+        try:
+            return json.loads(request.body)
+        except ValueError:
+            raise APIError('JSON parse error.')
+
+    async def paginate(self, paginator, queryset, request):
+        """
+        Fetch one keyset page of `queryset` with the async ORM.
+        """
+        paginator.request = request
+        paginator.model = queryset.model
+        paginator.page_size = paginator.get_page_size(request)
+        queryset = queryset.order_by(
+            *['-' + field for field in paginator.ordering])
+        position = paginator.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(paginator.get_keyset_filter(position))
+        rows = [row async for row in queryset[:paginator.page_size + 1]]
+        paginator.has_next = len(rows) > paginator.page_size
+        paginator.page = rows[:paginator.page_size]
+        return paginator.page
+
+    def paginated_response(self, paginator, data):
+        return JsonResponse({
+            'next': paginator.get_next_link(),
+            'results': data,
+        })
+
+
+class AsyncListPostView(AsyncAPIView):
+    """
+    An async view for listing posts, newest first.
+    """
+
+    async def get(self, request):
+        paginator = PostPagination()
+        posts = await self.paginate(paginator, Post.objects.all(), request)
+        return self.paginated_response(
+            paginator, PostSerializer(posts, many=True).data)
+
+
+class AsyncRetrievePostView(AsyncAPIView):
+    """
+    An async view for retrieving a specific post.
+    """
+
+    async def get(self, request, pk):
+        post = await Post.objects.select_related('user').aget(id=pk)
+        return JsonResponse(PostRetrieveUpdateDestroySerializer(post).data)
+
+
+class AsyncListCreateCommentView(AsyncAPIView):
+    """
+    An async view for listing and creating the comments of a post.
+    """
+
+    async def get(self, request, post_id):
+        paginator = CommentPagination()
+        comments = await self.paginate(
+            paginator, Comment.objects.filter(post=post_id), request)
+        return self.paginated_response(
+            paginator, CommentSerializer(comments, many=True).data)
+
+    async def post(self, request, post_id):
+        content = request.json.get('content')
+        if not content:
+            raise APIError({'content': ['This field is required.']})
+        post = await Post.objects.aget(id=post_id)
+        comment = await sync_to_async(self.create_comment)(
+            request.user, post, content)
+        return JsonResponse(CommentSerializer(comment).data, status=201)
+
+    def create_comment(self, user, post, content):
+        with transaction.atomic():
+            comment = Comment.objects.create(user=user, post=post, content=content)
+            activity.record(
+                activity.COMMENT_CREATED, f'comment:{comment.id}',
+                comment=comment.id, user=user.id, post=post.id,
+                author=post.user_id)
+        invalidate_post(post.id)
+        return comment
+
+
+class AsyncCreateLikeView(AsyncAPIView):
+    """
+    An async view for liking a post as the authenticated user.
+    """
+
+    async def post(self, request, post_id):
+        post = await Post.objects.aget(id=post_id)
+        like = await sync_to_async(self.create_like)(request.user, post)
+        return JsonResponse(LikePostSerializer(like).data, status=201)
+
+    def create_like(self, user, post):
+        """
+        Insert the like in a savepoint so a duplicate only rolls back itself.
+
+        Likes of posts past LIKE_BUFFER_THRESHOLD go to the like buffer.
+        """
+        if should_buffer(post):
+            if not buffer_like(user, post):
+                raise APIError(['You have already liked this post'])
+            notify_like(user.id, post.id, post.user_id)
+            return Like(user=user, post=post, created=timezone.now())
+        try:
+            with transaction.atomic():
+                like = Like.objects.create(user=user, post=post)
+                activity.record(activity.LIKE_CREATED, f'like:{like.id}',
+                                user=user.id, post=post.id, author=post.user_id)
+        except IntegrityError:
+            raise APIError(['You have already liked this post'])
+        invalidate_post(post.id)
+        return like
+
+
+class AsyncFollowView(AsyncAPIView):
+    """
+    An async view for following/unfollowing a user.
+    """
+    anonymous_methods = ('options',)
+
+    async def put(self, request, pk):
+        user_to_follow = await User.objects.aget(pk=pk)
+        user = request.user
+        if user_to_follow == user:
+            return JsonResponse({'message': 'You cannot follow yourself.'})
+        await sync_to_async(self.follow)(user, user_to_follow)
+        return JsonResponse({'message': 'Followed successfully!'})
+
+    async def delete(self, request, pk):
+        user_to_unfollow = await User.objects.aget(pk=pk)
+        user = request.user
+        await sync_to_async(self.unfollow)(user, user_to_unfollow)
+        return JsonResponse({'message': 'Unfollowed successfully!'})
+
+    def follow(self, user, user_to_follow):
+        with transaction.atomic():
+            follow, created = User.following.through.objects.get_or_create(
+                from_user=user, to_user=user_to_follow)
+            if created:
+                activity.record(activity.FOLLOW_CREATED, f'follow:{follow.id}',
+                                user=user.id, followed=user_to_follow.id)
+
+    def unfollow(self, user, user_to_unfollow):
+        with transaction.atomic():
+            follow = User.following.through.objects.filter(
+                from_user=user, to_user=user_to_unfollow).first()
+            if follow is not None:
+                activity.record(
+                    activity.FOLLOW_DELETED, f'follow:{follow.id}:deleted',
+                    user=user.id, followed=user_to_unfollow.id)
+                follow.delete()
+
+
+class AsyncLoginView(AsyncAPIView):
+    """
+    An async view for obtaining a JWT pair with a username and password.
+
+    The event loop awaits the password check in the hashing worker pool
+    instead of holding a thread for it. When the pool is full the login is
+    refused with a 503 and a Retry-After header.
+    """
+    anonymous_methods = ('post', 'options')
+
+    async def post(self, request):
+        username = request.json.get(User.USERNAME_FIELD)
+        password = request.json.get('password')
+        errors = {field: ['This field is required.']
+                  for field, value in [(User.USERNAME_FIELD, username),
+                                       ('password', password)] if not value}
+        if errors:
+            raise APIError(errors)
+        user = await acheck_credentials(username, password)
+        if user is None:
+            raise APIError(TokenObtainPairSerializer.default_error_messages[
+                'no_active_account'], status=401)
+        return JsonResponse(await sync_to_async(self.get_tokens)(user))
+
+    def get_tokens(self, user):
+        refresh = TokenObtainPairSerializer.get_token(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
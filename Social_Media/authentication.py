@@ -0,0 +1,151 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .hashing import (
+    PasswordHashingBusy,
+    hash_password,
+    verify_password,
+    ahash_password,
+    averify_password,
+)
+from .models import User
+
+
+class UserCache:
+    """
+    A thread-safe LRU cache of user objects with a time-to-live.
+
+    Entries are evicted on user updates and logout in this process; other
+    processes see the change once the TTL expires.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'JWT_USER_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'JWT_USER_CACHE_TTL', 60)
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[user_id] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def evict(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+def get_cached_user(user_id):
+    """
+    Return a private copy of a cached user, or None on a miss.
+    """
+    user = user_cache.get(user_id)
+    return copy.copy(user) if user is not None else None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that only loads the user row on a cache miss.
+
+    The token signature and expiry are verified on every request as usual;
+    the user object is then served from an in-process LRU cache keyed by
+    the user id claim, which saves one query per authenticated request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        user = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+            user = copy.copy(user)
+        return user
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend verifying passwords in the hashing worker pool.
+
+    When the pool is busy, API logins answer with a 503; other callers,
+    such as the admin login form, see a failed login instead of an error.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self._authenticate(username, password, **kwargs)
+        except PasswordHashingBusy:
+            if isinstance(request, Request):
+                raise
+            raise PermissionDenied
+
+    def _authenticate(self, username, password, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong
+            # passwords.
+            hash_password(password)
+            return None
+        if verify_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+async def acheck_credentials(username, password):
+    """
+    Return the active user with these credentials, or None.
+    """
+    user = await User._default_manager.filter(
+        **{User.USERNAME_FIELD: username}).afirst()
+    if user is None:
+        await ahash_password(password)
+        return None
+    if await averify_password(user, password) and user.is_active:
+        return user
+    return None
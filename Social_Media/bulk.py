@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db import transaction
+
+from . import activity
+from .models import User, Post, Like, SavedPost
+
+CREATED = 'created'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+def get_max_items():
+    """
+    Return the largest number of ids accepted by one batch request.
+    """
+    return getattr(settings, 'BULK_MAX_ITEMS', 100)
+
+
+def _results(ids, statuses):
+    return [{'id': pk, 'status': statuses[pk]} for pk in ids]
+
+
+def bulk_follow(user, ids):
+    """
+    Make `user` follow every user in `ids` in one transaction.
+
+    Side effects go through the activity log, keyed on each follow row like
+    a single follow, so a row inserted concurrently by another request is
+    counted once whichever request recorded it first.
+
+    Returns one {'id', 'status'} result per requested id.
+    """
+    Follow = User.following.through
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        found = set(User.objects.filter(id__in=ids).values_list('id', flat=True))
+        existing = set(Follow.objects.filter(
+            from_user=user, to_user__in=found).values_list('to_user', flat=True))
+        statuses = {}
+        for pk in ids:
+            if pk == user.id:
+                statuses[pk] = INVALID
+            elif pk not in found:
+                statuses[pk] = NOT_FOUND
+            elif pk in existing:
+                statuses[pk] = EXISTS
+            else:
+                statuses[pk] = CREATED
+        created = [pk for pk in ids if statuses[pk] == CREATED]
+        Follow.objects.bulk_create(
+            [Follow(from_user=user, to_user_id=pk) for pk in created],
+            ignore_conflicts=True,
+        )
+        follows = Follow.objects.filter(
+            from_user=user, to_user__in=created).values_list('id', 'to_user')
+        activity.record_many(activity.FOLLOW_CREATED, [
+            (f'follow:{follow_id}', {'user': user.id, 'followed': followed_id})
+            for follow_id, followed_id in follows])
+    return _results(ids, statuses)
+
+
+def _bulk_create_for_posts(model, user, ids):
+    ids = list(dict.fromkeys(ids))
+    found = set(Post.objects.filter(id__in=ids).values_list('id', flat=True))
+    existing = set(model.objects.filter(
+        user=user, post__in=found).values_list('post', flat=True))
+    statuses = {}
+    for pk in ids:
+        if pk not in found:
+            statuses[pk] = NOT_FOUND
+        elif pk in existing:
+            statuses[pk] = EXISTS
+        else:
+            statuses[pk] = CREATED
+    created = [pk for pk in ids if statuses[pk] == CREATED]
+    model.objects.bulk_create(
+        [model(user=user, post_id=pk) for pk in created],
+        ignore_conflicts=True,
+    )
+    return ids, statuses, created
+
+
+def bulk_like(user, ids):
+    """
+    Make `user` like every post in `ids` in one transaction.
+
+    Like bulk_follow, side effects are recorded per like row in the
+    activity log.
+
+    Returns one {'id', 'status'} result per requested id.
+    """
+    with transaction.atomic():
+        ids, statuses, created = _bulk_create_for_posts(Like, user, ids)
+        likes = Like.objects.filter(user=user, post__in=created) \
+            .values_list('id', 'post', 'post__user')
+        activity.record_many(activity.LIKE_CREATED, [
+            (f'like:{like_id}', {'user': user.id, 'post': post_id, 'author': author_id})
+            for like_id, post_id, author_id in likes])
+    return _results(ids, statuses)
+
+
+def bulk_save(user, ids):
+    """
+    Add every post in `ids` to the saved posts of `user` in one transaction.
+
+    Returns one {'id', 'status'} result per requested id.
+    """
+    with transaction.atomic():
+        ids, statuses, _ = _bulk_create_for_posts(SavedPost, user, ids)
+    return _results(ids, statuses)
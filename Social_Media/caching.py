@@ -0,0 +1,127 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import routers
+from .models import Post
+
+
+def get_cache():
+    """
+    Return the cache backend used for post data.
+    """
+    return caches[getattr(settings, 'POST_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    """
+    Return how long cached post data lives, in seconds.
+    """
+    return getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+
+
+def _version_key(post_id):
+    return f'post:{post_id}:version'
+
+
+def _modified_key(post_id):
+    return f'post:{post_id}:modified'
+
+
+def get_post_version(post_id):
+    """
+    Return the current cache version of a post.
+
+    A missing version starts at the current time rather than 1, so entries
+    written under an evicted version can never be read again.
+    """
+    cache = get_cache()
+    key = _version_key(post_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_post(post_id):
+    """
+    Bump the version of a post once the current transaction commits.
+
+    Every cached entry of the post (detail, comment and like pages) is keyed
+    by its version, so stale entries are simply never read again and expire.
+    """
+    def bump():
+        cache = get_cache()
+        key = _version_key(post_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        cache.set(_modified_key(post_id), time.time(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_user_posts(user_id):
+    """
+    Invalidate every post of a user, whose cached entries embed the author.
+    """
+    for post_id in Post.objects.filter(user=user_id).values_list('id', flat=True):
+        invalidate_post(post_id)
+
+
+def get_post_state(post_id):
+    """
+    Return the version of a post and when it last changed, in one round trip.
+
+    The modification time is a Unix timestamp, or None when it is unknown
+    because the post has not changed since its version was created.
+    """
+    version_key, modified_key = _version_key(post_id), _modified_key(post_id)
+    values = get_cache().get_many([version_key, modified_key])
+    version = values.get(version_key)
+    if version is None:
+        return get_post_version(post_id), None
+    return version, values.get(modified_key)
+
+
+def post_etag(post_id, version, name, *parts):
+    """
+    Build a weak ETag for an entry of a post at the given version.
+    """
+    digest = hashlib.md5(':'.join(parts).encode(),
+                         usedforsecurity=False).hexdigest()[:12]
+    return f'W/"{post_id}-{version}-{name}-{digest}"'
+
+
+def post_cache_key(post_id, name, *parts, version=None):
+    if version is None:
+        version = get_post_version(post_id)
+    return ':'.join(['post', str(post_id), f'v{version}', name, *parts])
+
+
+def read_through(post_id, name, parts, compute, version=None):
+    """
+    Return a cached entry of a post, computing and storing it on a miss.
+
+    Parameters:
+    - post_id: The id of the post the entry belongs to.
+    - name: The kind of entry, e.g. 'detail' or 'comments'.
+    - parts: Extra strings identifying the entry, such as the query string.
+    - compute: A callable returning the value to cache. It reads from the
+      primary, so an entry stored under a new version never holds replica
+      data from before the write that bumped it.
+    - version: The post version, when the caller already fetched it.
+    """
+    cache = get_cache()
+    key = post_cache_key(post_id, name, *parts, version=version)
+    value = cache.get(key)
+    if value is None:
+        with routers.use_primary():
+            value = compute()
+        cache.set(key, value, timeout=get_timeout())
+    return value
@@ -0,0 +1,11 @@
+from django.db.models import F
+
+
+def apply(model, pk, field, delta):
+    """
+    Add `delta` to a counter column of one row with a single UPDATE.
+
+    The UPDATE only touches the counter column and never reads it back, so
+    concurrent updates are not lost.
+    """
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
@@ -0,0 +1,202 @@
+import csv
+import io
+import zipfile
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import User, Post, Comment, Like, SavedPost
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+# The exported columns of each kind of row, and the column selecting the
+# rows of one user.
+KINDS = {
+    'posts': (Post, 'user', (
+        'id', 'title', 'content', 'file', 'thumbnail', 'poster', 'rendition',
+        'media_status', 'created', 'num_post_likes', 'num_comments')),
+    'comments': (Comment, 'user', ('id', 'post', 'content', 'created_at')),
+    'likes': (Like, 'user', ('id', 'post', 'created')),
+    'saved_posts': (SavedPost, 'user', ('id', 'post')),
+}
+CSV_COLUMNS = ['type'] + list(dict.fromkeys(
+    column for _, _, columns in KINDS.values() for column in columns))
+MEDIA_FIELDS = ('file', 'thumbnail', 'poster', 'rendition')
+
+
+def get_chunk_size():
+    """
+    Return the number of rows fetched from the database at a time.
+    """
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def iter_rows(user_id, kinds):
+    """
+    Yield the rows of a user as dicts with a 'type' key, one kind after
+    the other in id order.
+
+    Rows are fetched `EXPORT_CHUNK_SIZE` at a time without building model
+    instances, so memory use does not grow with the size of the export.
+    """
+    for kind in kinds:
+        model, owner, columns = KINDS[kind]
+        rows = model.objects.filter(**{owner: user_id}).order_by('id') \
+            .values_list(*columns).iterator(chunk_size=get_chunk_size())
+        for row in rows:
+            yield {'type': kind, **dict(zip(columns, row))}
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= get_chunk_size():
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_ndjson(rows):
+    """
+    Encode rows as newline-delimited JSON, one chunk of bytes per batch.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for batch in _batches(rows):
+        yield ''.join(encoder.encode(row) + '\n' for row in batch).encode()
+
+
+def iter_csv(rows):
+    """
+    Encode rows as CSV with one column per field of any kind, one chunk of
+    bytes per batch. Fields a kind does not have are left empty.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_COLUMNS)
+    writer.writeheader()
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    """
+    Compress a stream of bytes to gzip on the fly.
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_media(user_id):
+    """
+    Yield the storage name of every media file of a user's posts and of
+    their avatar.
+    """
+    rows = Post.objects.filter(user=user_id).order_by('id') \
+        .values_list(*MEDIA_FIELDS).iterator(chunk_size=get_chunk_size())
+    for row in rows:
+        yield from (name for name in row if name)
+    avatar = User.objects.filter(pk=user_id).values_list('avatar', flat=True).first()
+    if avatar:
+        yield avatar
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    A write-only, unseekable file collecting what zipfile writes, so the
+    archive can be streamed as it is built.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(name, chunks, media):
+    """
+    Stream a zip archive holding the export as `name` and each media file
+    under media/.
+
+    Files are read from storage in blocks, so the archive is never held in
+    memory. Missing media files are skipped.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(name, 'w', force_zip64=True) as entry:
+            for chunk in chunks:
+                entry.write(chunk)
+                yield stream.take()
+        for media_name in media:
+            try:
+                source = default_storage.open(media_name, 'rb')
+            except (FileNotFoundError, OSError):
+                continue
+            with source, archive.open(f'media/{media_name}', 'w',
+                                      force_zip64=True) as entry:
+                for block in iter(lambda: source.read(64 * 1024), b''):
+                    entry.write(block)
+                    yield stream.take()
+    yield stream.take()
+
+
+async def aiter_chunks(chunks):
+    """
+    Iterate a stream of chunks asynchronously, producing each one in the
+    sync thread.
+
+    StreamingHttpResponse collects a sync iterator into a list before
+    sending it under ASGI; pulling chunks one at a time keeps the export
+    streamed, and the database cursor on the thread that opened it.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
+
+
+def export(user_id, kinds=None, output=NDJSON, compress=False, media=False):
+    """
+    Return (chunks, content type, file name) for the export of a user.
+
+    `chunks` is an iterator of bytes. With `media` the export and the media
+    files of the user's posts are bundled in a zip archive, which is
+    already compressed; otherwise `compress` gzips the export.
+    """
+    kinds = list(kinds or KINDS)
+    rows = iter_rows(user_id, kinds)
+    name = f'export.{output}'
+    if output == CSV:
+        chunks, content_type = iter_csv(rows), 'text/csv'
+    else:
+        chunks, content_type = iter_ndjson(rows), 'application/x-ndjson'
+    if media:
+        return (zip_chunks(name, chunks, iter_media(user_id)),
+                'application/zip', 'export.zip')
+    if compress:
+        return gzip_chunks(chunks), 'application/gzip', name + '.gz'
+    return chunks, content_type, name
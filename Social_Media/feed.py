@@ -0,0 +1,118 @@
+import heapq
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, TimelineEntry
+
+
+def get_fanout_threshold():
+    """
+    Return the follower count above which posts are fanned out on read.
+    """
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+
+
+def get_backfill_size():
+    """
+    Return how many recent posts are copied into a timeline on follow.
+    """
+    return getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+
+
+def is_celebrity(user):
+    """
+    Check whether posts by the given user are too expensive to fan out on write.
+    """
+    return user.num_followers > get_fanout_threshold()
+
+
+def fan_out_post(post):
+    """
+    Write a timeline entry for the post to the author and each follower.
+
+    Authors above the fan-out threshold only get their own entry; their
+    followers pick the post up at read time instead.
+    """
+    author = post.user
+    recipient_ids = [author.id]
+    if not is_celebrity(author):
+        recipient_ids.extend(
+            author.followers.values_list('id', flat=True).iterator())
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created=post.created)
+         for user_id in recipient_ids],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def backfill_timeline(user_id, author_ids):
+    """
+    Copy the most recent posts of newly followed authors into a timeline.
+
+    The posts of every author are picked with one windowed query; authors
+    above the fan-out threshold are skipped.
+    """
+    posts = Post.objects.filter(
+        user__in=author_ids,
+        user__num_followers__lte=get_fanout_threshold(),
+    ).annotate(rank=Window(
+        RowNumber(), partition_by=F('user'),
+        order_by=(F('created').desc(), F('id').desc()),
+    )).filter(rank__lte=get_backfill_size()).values_list('id', 'created')
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+         for post_id, created in posts],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def remove_from_timeline(user, author):
+    """
+    Drop the posts of an unfollowed author from a timeline.
+    """
+    TimelineEntry.objects.filter(user=user, post__user=author).delete()
+
+
+def _before(field, before):
+    """
+    Build a keyset filter selecting rows strictly older than the cursor.
+    """
+    created, post_id = before
+    return (Q(**{'created__lt': created}) |
+            Q(**{'created': created, field + '__lt': post_id}))
+
+
+def get_feed(user, limit=20, before=None):
+    """
+    Return up to `limit` posts for the user's home timeline, newest first.
+
+    Parameters:
+    - user: The user whose timeline is read.
+    - limit: The maximum number of posts to return.
+    - before: An optional (created, post id) pair; only older posts are returned.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(_before('post_id', before))
+    post_ids = list(entries.order_by('-created', '-post_id')
+                    .values_list('post_id', flat=True)[:limit])
+    posts = list(Post.objects.filter(id__in=post_ids)
+                 .order_by('-created', '-id'))
+
+    celebrities = user.following.filter(
+        num_followers__gt=get_fanout_threshold())
+    pulled = Post.objects.filter(user__in=celebrities)
+    if before is not None:
+        pulled = pulled.filter(_before('id', before))
+    pulled = list(pulled.exclude(id__in=post_ids)
+                  .order_by('-created', '-id')[:limit])
+
+    if not pulled:
+        return posts
+    merged = heapq.merge(posts, pulled, key=lambda post: (
+        post.created, post.id), reverse=True)
+    return list(merged)[:limit]
@@ -0,0 +1,183 @@
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .caching import get_cache
+from .models import User
+
+Follow = User.following.through
+
+
+def get_suggestions_size():
+    """
+    Return how many follow suggestions are kept per user.
+    """
+    return getattr(settings, 'SUGGESTIONS_SIZE', 100)
+
+
+def get_suggestions_timeout():
+    return getattr(settings, 'SUGGESTIONS_CACHE_TIMEOUT', 3600)
+
+
+def _suggestions_key(user_id):
+    return f'suggestions:{user_id}'
+
+
+def followers_of(user_id):
+    """
+    Return the follow edges pointing at a user, most recent first.
+    """
+    return Follow.objects.filter(to_user=user_id).select_related('from_user')
+
+
+def following_of(user_id):
+    """
+    Return the follow edges starting at a user, most recent first.
+    """
+    return Follow.objects.filter(from_user=user_id).select_related('to_user')
+
+
+def relationship(user_id, other_id):
+    """
+    Describe how two users follow each other, in one query.
+    """
+    edges = set(Follow.objects.filter(
+        Q(from_user=user_id, to_user=other_id) |
+        Q(from_user=other_id, to_user=user_id),
+    ).values_list('from_user', flat=True))
+    following = user_id in edges
+    followed_by = other_id in edges
+    return {
+        'following': following,
+        'followed_by': followed_by,
+        'mutual': following and followed_by,
+    }
+
+
+def _top(scores):
+    return dict(heapq.nlargest(
+        get_suggestions_size(), scores.items(),
+        key=lambda item: (item[1], -item[0])))
+
+
+def compute_suggestions(user_ids):
+    """
+    Compute friend-of-friend suggestions for a batch of users.
+
+    A candidate is someone followed by the people a user follows, scored by
+    how many of them follow it. One grouped query covers the whole batch;
+    users already followed and the user themselves are left out.
+
+    Returns a dict mapping each user id to a {candidate id: score} dict.
+    """
+    user_ids = list(user_ids)
+    followed = defaultdict(set)
+    for from_user, to_user in Follow.objects.filter(
+            from_user__in=user_ids).values_list('from_user', 'to_user'):
+        followed[from_user].add(to_user)
+
+    scores = defaultdict(dict)
+    rows = (Follow.objects
+            .filter(from_user__followers__in=user_ids)
+            .values_list('from_user__followers', 'to_user')
+            .annotate(score=Count('id'))
+            .order_by())
+    for user_id, candidate, score in rows:
+        if candidate != user_id and candidate not in followed[user_id]:
+            scores[user_id][candidate] = score
+    return {user_id: _top(scores[user_id]) for user_id in user_ids}
+
+
+def store_suggestions(suggestions):
+    """
+    Cache the suggestions computed by `compute_suggestions`.
+    """
+    get_cache().set_many(
+        {_suggestions_key(user_id): scores
+         for user_id, scores in suggestions.items()},
+        timeout=get_suggestions_timeout())
+
+
+def get_suggestions(user_id, limit=20):
+    """
+    Return up to `limit` (candidate id, score) pairs, best first.
+
+    Suggestions are read from the cache and computed on a miss.
+    """
+    scores = get_cache().get(_suggestions_key(user_id))
+    if scores is None:
+        suggestions = compute_suggestions([user_id])
+        store_suggestions(suggestions)
+        scores = suggestions[user_id]
+    return heapq.nlargest(limit, scores.items(),
+                          key=lambda item: (item[1], -item[0]))
+
+
+def on_follow(user_id, followed_id):
+    """
+    Update the cached suggestions of a user after they follow someone.
+
+    The newly followed user stops being a candidate and everyone they
+    follow gains one point. The cache only keeps the top SUGGESTIONS_SIZE
+    candidates, so once it is full a candidate missing from it may already
+    have a score; those are counted with one grouped query instead of
+    starting from zero. Suggestions of other users are left to expire.
+    """
+    cache = get_cache()
+    key = _suggestions_key(user_id)
+    scores = cache.get(key)
+    if scores is None:
+        return
+    truncated = len(scores) >= get_suggestions_size()
+    scores.pop(followed_id, None)
+    already_followed = Follow.objects.filter(
+        from_user=user_id).values('to_user')
+    candidates = list(Follow.objects.filter(from_user=followed_id)
+                      .exclude(to_user=user_id)
+                      .exclude(to_user__in=already_followed)
+                      .values_list('to_user', flat=True))
+    missing = [candidate for candidate in candidates if candidate not in scores]
+    exact = {}
+    if truncated and missing:
+        # The follow is committed, so these counts already include it.
+        exact = dict(Follow.objects
+                     .filter(from_user__followers=user_id, to_user__in=missing)
+                     .values_list('to_user')
+                     .annotate(score=Count('id'))
+                     .order_by())
+    for candidate in candidates:
+        if candidate in exact:
+            scores[candidate] = exact[candidate]
+        else:
+            scores[candidate] = scores.get(candidate, 0) + 1
+    cache.set(key, _top(scores), timeout=get_suggestions_timeout())
+
+
+def on_unfollow(user_id, unfollowed_id):
+    """
+    Update the cached suggestions of a user after they unfollow someone.
+
+    Lowered scores may fall below candidates the full cache had dropped,
+    so a full cache is deleted and recomputed on the next read instead.
+    """
+    cache = get_cache()
+    key = _suggestions_key(user_id)
+    scores = cache.get(key)
+    if scores is None:
+        return
+    if len(scores) >= get_suggestions_size():
+        cache.delete(key)
+        return
+    for candidate in Follow.objects.filter(
+            from_user=unfollowed_id).values_list('to_user', flat=True):
+        if candidate in scores:
+            scores[candidate] -= 1
+            if scores[candidate] <= 0:
+                del scores[candidate]
+    score = Follow.objects.filter(
+        from_user__followers=user_id, to_user=unfollowed_id).count()
+    if score and unfollowed_id != user_id:
+        scores[unfollowed_id] = score
+    cache.set(key, _top(scores), timeout=get_suggestions_timeout())
@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+def get_hash_workers():
+    """
+    Return the number of password hashing processes; 0 hashes inline.
+    """
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', 0)
+
+
+def get_max_pending():
+    """
+    Return how many hashes may be queued or running before new ones are
+    refused.
+    """
+    return getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 16)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with its iteration count read from PASSWORD_HASH_ITERATIONS.
+
+    Stored hashes with another count are upgraded on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or \
+            hashers.PBKDF2PasswordHasher.iterations
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, try again shortly.'
+    default_code = 'password_hashing_busy'
+    wait = 1
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _hash(password):
+    return hashers.make_password(password)
+
+
+def _verify(password, encoded):
+    """
+    Return whether `password` matches `encoded`, and the upgraded hash when
+    the stored one uses outdated parameters.
+    """
+    upgraded = []
+    valid = hashers.check_password(
+        password, encoded, setter=lambda raw: upgraded.append(_hash(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=get_hash_workers(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker)
+    return _executor
+
+
+def _release(future):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _submit(function, *args):
+    """
+    Queue `function` on the worker pool, or return None to run it inline.
+
+    Raises PasswordHashingBusy instead of queueing more than
+    PASSWORD_HASH_MAX_PENDING hashes, so a burst of logins is answered
+    right away instead of holding every request worker.
+    """
+    global _executor, _pending
+    if not get_hash_workers():
+        return None
+    with _lock:
+        if _pending >= get_max_pending():
+            raise PasswordHashingBusy()
+        try:
+            future = _get_executor().submit(function, *args)
+        except BrokenProcessPool:
+            _executor = None
+            raise PasswordHashingBusy()
+        _pending += 1
+    future.add_done_callback(_release)
+    return future
+
+
+def _result(future):
+    global _executor
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        with _lock:
+            _executor = None
+        raise PasswordHashingBusy()
+
+
+def hash_password(password):
+    """
+    Hash a password in the worker pool, like make_password.
+    """
+    future = _submit(_hash, password)
+    return _hash(password) if future is None else _result(future)
+
+
+def verify_password(user, password):
+    """
+    Check a user's password in the worker pool, like User.check_password,
+    saving the upgraded hash when the hasher parameters changed.
+    """
+    future = _submit(_verify, password, user.password)
+    valid, upgraded = _verify(password, user.password) if future is None \
+        else _result(future)
+    if upgraded is not None:
+        user.password = upgraded
+        user.save(update_fields=['password'])
+    return valid
+
+
+async def _aresult(future):
+    global _executor
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        with _lock:
+            _executor = None
+        raise PasswordHashingBusy()
+
+
+async def ahash_password(password):
+    """
+    Async hash_password: the event loop waits on the pool without blocking.
+    """
+    future = _submit(_hash, password)
+    if future is None:
+        return await sync_to_async(_hash, thread_sensitive=False)(password)
+    return await _aresult(future)
+
+
+async def averify_password(user, password):
+    """
+    Async verify_password.
+    """
+    future = _submit(_verify, password, user.password)
+    if future is None:
+        valid, upgraded = await sync_to_async(
+            _verify, thread_sensitive=False)(password, user.password)
+    else:
+        valid, upgraded = await _aresult(future)
+    if upgraded is not None:
+        user.password = upgraded
+        await user.asave(update_fields=['password'])
+    return valid
@@ -0,0 +1,256 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+
+from . import activity
+from .models import Post, Like
+
+logger = logging.getLogger(__name__)
+
+# Atomically empty the set of posts with pending likes and take the likes
+# hash of each. Returns {post id, {user id, timestamp, ...}, ...}.
+TAKE_SCRIPT = """
+local taken = {}
+for _, post_id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local key = KEYS[1] .. ':' .. post_id
+    local likes = redis.call('HGETALL', key)
+    redis.call('DEL', key)
+    if #likes > 0 then
+        table.insert(taken, post_id)
+        table.insert(taken, likes)
+    end
+end
+redis.call('DEL', KEYS[1])
+return taken
+"""
+
+
+def get_buffer_threshold():
+    """
+    Return the like count from which likes of a post are written behind,
+    or None when every like is inserted right away.
+    """
+    return getattr(settings, 'LIKE_BUFFER_THRESHOLD', None)
+
+
+def get_flush_interval():
+    """
+    Return the number of seconds buffered likes are held before flushing.
+    """
+    return getattr(settings, 'LIKE_FLUSH_INTERVAL', 1.0)
+
+
+def should_buffer(post):
+    threshold = get_buffer_threshold()
+    return threshold is not None and post.num_post_likes >= threshold
+
+
+class MemoryLikeStore:
+    """
+    Pending likes kept in this process, as {post id: {user id: timestamp}}.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(dict)
+
+    def add(self, post_id, user_id, timestamp):
+        with self.lock:
+            likes = self.pending[post_id]
+            if user_id in likes:
+                return False
+            likes[user_id] = timestamp
+            return True
+
+    def get(self, post_id, user_id):
+        with self.lock:
+            return self.pending.get(post_id, {}).get(user_id)
+
+    def count(self, post_id):
+        with self.lock:
+            return len(self.pending.get(post_id, ()))
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(dict)
+        return pending
+
+    def restore(self, post_id, likes):
+        with self.lock:
+            pending = self.pending[post_id]
+            for user_id, timestamp in likes.items():
+                pending.setdefault(user_id, timestamp)
+
+
+class RedisLikeStore:
+    """
+    Pending likes kept in Redis and shared by every process.
+
+    Each post has a hash of user id to timestamp; HSETNX makes adding a like
+    idempotent. A set lists the posts with pending likes. A flush takes
+    every hash with one Lua script, so likes added meanwhile go to a fresh
+    hash and are picked up by the next flush.
+    """
+    prefix = 'likes:pending'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'The redis like buffer requires the redis package.')
+        if not url:
+            raise ImproperlyConfigured(
+                'Set LIKE_BUFFER_REDIS_URL to use the redis like buffer.')
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(TAKE_SCRIPT)
+
+    def _key(self, post_id):
+        return f'{self.prefix}:{post_id}'
+
+    def add(self, post_id, user_id, timestamp):
+        added = self.client.hsetnx(self._key(post_id), user_id, timestamp)
+        self.client.sadd(self.prefix, post_id)
+        return bool(added)
+
+    def get(self, post_id, user_id):
+        value = self.client.hget(self._key(post_id), user_id)
+        return float(value) if value is not None else None
+
+    def count(self, post_id):
+        return self.client.hlen(self._key(post_id))
+
+    def take(self):
+        taken = self.take_script(keys=[self.prefix])
+        pending = {}
+        for post_id, likes in zip(taken[::2], taken[1::2]):
+            pending[int(post_id)] = {
+                int(user_id): float(timestamp)
+                for user_id, timestamp in zip(likes[::2], likes[1::2])}
+        return pending
+
+    def restore(self, post_id, likes):
+        with self.client.pipeline() as pipeline:
+            for user_id, timestamp in likes.items():
+                pipeline.hsetnx(self._key(post_id), user_id, timestamp)
+            pipeline.sadd(self.prefix, post_id)
+            pipeline.execute()
+
+
+_store = None
+_store_lock = threading.Lock()
+_flusher = None
+
+
+def get_store():
+    """
+    Return the pending like store selected by LIKE_BUFFER_BACKEND.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            name = getattr(settings, 'LIKE_BUFFER_BACKEND', 'memory')
+            if name == 'memory':
+                _store = MemoryLikeStore()
+            elif name == 'redis':
+                _store = RedisLikeStore(
+                    getattr(settings, 'LIKE_BUFFER_REDIS_URL', None))
+            else:
+                raise ImproperlyConfigured(
+                    f'Unknown like buffer {name!r}; use "memory" or "redis".')
+        return _store
+
+
+def _run_flusher():
+    while True:
+        time.sleep(get_flush_interval())
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush buffered likes')
+        finally:
+            close_old_connections()
+
+
+def start_flusher():
+    """
+    Start the background thread flushing buffered likes, once per process.
+    """
+    global _flusher
+    with _store_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run_flusher, name='like-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def buffer_like(user, post):
+    """
+    Record a like to be inserted by the next flush.
+
+    Returns False if the user already liked the post, either in the
+    database or in the buffer.
+    """
+    if Like.objects.filter(user=user, post=post).exists():
+        return False
+    start_flusher()
+    return get_store().add(post.id, user.id, time.time())
+
+
+def get_pending_like(post_id, user_id):
+    """
+    Return a buffered like of a user as an unsaved Like, or None.
+    """
+    timestamp = get_store().get(post_id, user_id)
+    if timestamp is None:
+        return None
+    return Like(user_id=user_id, post_id=post_id,
+                created=datetime.fromtimestamp(timestamp, tz=timezone.utc))
+
+
+def get_pending_count(post_id):
+    return get_store().count(post_id)
+
+
+def flush():
+    """
+    Insert every buffered like and record its side effects.
+
+    Each inserted row gets a LIKE_CREATED event keyed by its id, like the
+    direct and bulk like paths, so the outbox counts every row exactly once
+    even when one of those paths inserted it first; the post counter
+    catches up once the worker applies them. Each like keeps the time
+    it was buffered at. The likes of a post are inserted in one
+    transaction; if it fails they are put back in the buffer for the next
+    flush.
+    """
+    for post_id, likes in get_store().take().items():
+        try:
+            with transaction.atomic():
+                existing = set(Like.objects.filter(
+                    post=post_id, user__in=likes).values_list('user', flat=True))
+                new = [user_id for user_id in likes if user_id not in existing]
+                if not new:
+                    continue
+                Like.objects.bulk_create(
+                    [Like(user_id=user_id, post_id=post_id,
+                          created=datetime.fromtimestamp(likes[user_id], tz=timezone.utc))
+                     for user_id in new],
+                    ignore_conflicts=True)
+                rows = Like.objects.filter(post=post_id, user__in=new) \
+                    .values_list('id', 'user', 'post__user')
+                activity.record_many(activity.LIKE_CREATED, [
+                    (f'like:{like_id}', {'user': user_id, 'post': post_id,
+                                         'author': author_id, 'buffered': True})
+                    for like_id, user_id, author_id in rows])
+        except Exception:
+            get_store().restore(post_id, likes)
+            logger.exception('Could not flush the likes of post %s', post_id)
@@ -0,0 +1,236 @@
+import json
+import re
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Social_Media.models import User, Post, Comment, Like, SavedPost
+from Social_Media.urls import urlpatterns
+from .loadtest import run_load
+from .seed_graph import PASSWORD
+
+METRIC_RE = re.compile(
+    r'^social_media_(request_queries_total|request_duration_seconds_count)'
+    r'\{view="([^"]+)",method="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+# Routes that change state on every call, so repeating them would measure a
+# different code path (conflicts, toggles, revoked tokens) after the first.
+SKIPPED = {
+    'register', 'token_blacklist', 'uploads', 'upload-details',
+    'bulk-follow', 'bulk-like', 'bulk-savedPosts', 'async-add-like',
+    'async-follow',
+}
+
+
+def scrape(base_url):
+    """
+    Return {(view, method): (requests, queries)} from the server's /metrics.
+    """
+    with urlopen(base_url + '/metrics', timeout=30) as response:
+        text = response.read().decode()
+    totals = {}
+    for name, view, method, value in METRIC_RE.findall(text):
+        requests, queries = totals.get((view, method), (0, 0))
+        if name == 'request_queries_total':
+            queries = float(value)
+        else:
+            requests = float(value)
+        totals[(view, method)] = requests, queries
+    return totals
+
+
+def build_scenarios(user, refresh):
+    """
+    Map each URL name to the (method, path, body) used to read it.
+    """
+    post = Post.objects.order_by('-num_post_likes', '-id').first()
+    comment = Comment.objects.filter(post=post).order_by('-id').first()
+    saved = SavedPost.objects.filter(user=user).first()
+    other = User.objects.exclude(pk=user.pk).order_by('-num_followers').first()
+    if post is None or comment is None or other is None:
+        raise CommandError('The database is empty; run seed_graph first.')
+
+    scenarios = {
+        'users': ('GET', reverse('users'), None),
+        'token_obtain_pair': ('POST', reverse('token_obtain_pair'),
+                              {'username': user.username, 'password': PASSWORD}),
+        'async-login': ('POST', reverse('async-login'),
+                        {'username': user.username, 'password': PASSWORD}),
+        'token_refresh': ('POST', reverse('token_refresh'),
+                          {'refresh': str(refresh)}),
+        'feed': ('GET', reverse('feed'), None),
+        'search': ('GET', reverse('search') + '?q=synthetic', None),
+        'posts': ('GET', reverse('posts'), None),
+        'trending-posts': ('GET', reverse('trending-posts'), None),
+        'post-details': ('GET', reverse('post-details', args=[post.pk]), None),
+        'add-like': ('GET', reverse('add-like', args=[post.pk]), None),
+        'comments': ('GET', reverse('comments', args=[post.pk]), None),
+        'comment-details': ('GET', reverse(
+            'comment-details', args=[post.pk, comment.pk]), None),
+        'savedPosts': ('GET', reverse('savedPosts', args=[user.pk]), None),
+        'followers': ('GET', reverse('followers', args=[other.pk]), None),
+        'following': ('GET', reverse('following', args=[user.pk]), None),
+        'export': ('GET', reverse('export', args=[user.pk]), None),
+        'relationship': ('GET', reverse('relationship', args=[other.pk]), None),
+        'suggestions': ('GET', reverse('suggestions'), None),
+        'async-posts': ('GET', reverse('async-posts'), None),
+        'async-post-details': ('GET', reverse(
+            'async-post-details', args=[post.pk]), None),
+        'async-comments': ('GET', reverse('async-comments', args=[post.pk]), None),
+    }
+    if saved is not None:
+        scenarios['savedPost-details'] = (
+            'GET', reverse('savedPost-details', args=[user.pk, saved.pk]), None)
+    return scenarios
+
+
+def build_write_scenarios(user, requests):
+    """
+    Map each URL name to the (method, paths, body) used to write through it.
+
+    Likes and follows conflict when repeated, so every request gets its own
+    target: a post the user has not liked or a user they do not follow yet.
+    Fewer requests are sent when the database runs out of targets.
+    """
+    post = Post.objects.order_by('-num_post_likes', '-id').first()
+    liked = Like.objects.filter(user=user).values('post')
+    unliked = (Post.objects.exclude(pk__in=liked)
+               .order_by('-id').values_list('pk', flat=True)[:requests])
+    followed = User.following.through.objects.filter(
+        from_user=user).values('to_user')
+    unfollowed = (User.objects.exclude(pk=user.pk).exclude(pk__in=followed)
+                  .order_by('-id').values_list('pk', flat=True)[:requests])
+    return {
+        'posts': ('POST', [reverse('posts')], {
+            'user': user.pk, 'title': 'benchmark',
+            'content': 'synthetic benchmark post'}),
+        'add-like': ('POST', [reverse('add-like', args=[pk]) for pk in unliked],
+                     {'post': post.pk}),
+        'comments': ('POST', [reverse('comments', args=[post.pk])], {
+            'post': post.pk, 'content': 'synthetic benchmark comment'}),
+        'follow': ('PUT', [reverse('follow', args=[pk]) for pk in unfollowed],
+                   {}),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Load every API route of a running server with concurrent clients '
+            'and report latency percentiles and queries per request. Reads '
+            'run first; writes then create posts, comments, likes and follows '
+            'as the benchmark user, so reseed before comparing runs.\n\n'
+            'Seed the database with seed_graph, start a single-process server '
+            'on the same database (queries are read from its /metrics), e.g.\n'
+            '  THROTTLE_ENABLED=0 manage.py runserver --noreload\n'
+            'then run\n'
+            '  manage.py benchmark_api --output main.json\n'
+            '  manage.py benchmark_api --baseline main.json --max-regression 20')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Base URL of the server.')
+        parser.add_argument('--user', default='bench-0',
+                            help='Username the requests authenticate as.')
+        parser.add_argument('--route', action='append',
+                            help='Only load these URL names.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per route.')
+        parser.add_argument('--output', help='Save the results as JSON here.')
+        parser.add_argument('--baseline',
+                            help='Compare with results saved by --output.')
+        parser.add_argument(
+            '--max-regression', type=float,
+            help='Fail if a route p95 grows by more than this percentage or '
+                 'runs more queries than in the baseline.')
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist; '
+                               f'run seed_graph first.')
+        refresh = RefreshToken.for_user(user)
+        reads = build_scenarios(user, refresh)
+        writes = build_write_scenarios(user, options['requests'])
+
+        names = [pattern.name for pattern in urlpatterns]
+        missing = [name for name in names if name not in reads
+                   and name not in writes and name not in SKIPPED]
+        if missing:
+            self.stderr.write(f'No scenario for: {", ".join(missing)}')
+        if options['route']:
+            names = [name for name in names if name in options['route']]
+
+        runs = []
+        for name in names:
+            if name in reads:
+                method, path, body = reads[name]
+                runs.append((name, method, [path], body, options['requests']))
+        for name in names:
+            if name in writes:
+                method, paths, body = writes[name]
+                requests = (options['requests'] if len(paths) == 1
+                            else min(options['requests'], len(paths)))
+                runs.append((f'{name} {method}', method, paths, body, requests))
+
+        results = {}
+        for label, method, paths, body, requests in runs:
+            if not requests:
+                self.stderr.write(f'No targets left for {label}; reseed.')
+                continue
+            name = label.split()[0]
+            before = scrape(base_url).get((name, method), (0, 0))
+            result = run_load(
+                [base_url + path for path in paths], options['concurrency'],
+                requests, token=str(refresh.access_token), method=method,
+                body=body)
+            after = scrape(base_url).get((name, method), (0, 0))
+            served = after[0] - before[0]
+            result['queries_per_request'] = (
+                (after[1] - before[1]) / served if served else None)
+            results[label] = result
+            self.report(label, result)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'url': base_url, 'routes': results}, output, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['max_regression'])
+
+    def report(self, name, result):
+        queries = result['queries_per_request']
+        queries = '-' if queries is None else f'{queries:.1f}'
+        self.stdout.write(
+            f'{name:<22}{result["requests_per_second"]:>9.1f} req/s'
+            f'{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+            f'{result["p99_ms"]:>9.1f} ms  {queries:>6} queries'
+            f'{result["errors"]:>6} errors')
+
+    def compare(self, results, path, max_regression):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['routes']
+        regressions = []
+        self.stdout.write(f'\n{"route":<22}{"p95 before":>12}{"p95 after":>12}'
+                          f'{"change":>9}{"queries":>12}')
+        for name, result in results.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            change = ((result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+                      if old['p95_ms'] else 0.0)
+            queries = (f'{old["queries_per_request"] or 0:.1f}->'
+                       f'{result["queries_per_request"] or 0:.1f}')
+            self.stdout.write(f'{name:<22}{old["p95_ms"]:>12.1f}'
+                              f'{result["p95_ms"]:>12.1f}{change:>8.1f}%'
+                              f'{queries:>12}')
+            if max_regression is None:
+                continue
+            if change > max_regression:
+                regressions.append(f'{name}: p95 {change:+.1f}%')
+            if (result['queries_per_request'] or 0) > (old['queries_per_request'] or 0):
+                regressions.append(f'{name}: {queries} queries')
+        if regressions:
+            raise CommandError('Regressions:\n' + '\n'.join(regressions))
@@ -0,0 +1,90 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from .loadtest import run_load
+from .seed_graph import PASSWORD
+
+
+class Command(BaseCommand):
+    help = ('Load the login endpoint of a running server at increasing '
+            'concurrency, while probing another route, and report the best '
+            'login throughput whose p99 latency stays under --p99.\n\n'
+            'Seed the database with seed_graph and start the server without '
+            'throttling, e.g.\n'
+            '  THROTTLE_ENABLED=0 PASSWORD_HASH_WORKERS=4 '
+            'gunicorn confing.wsgi -w 4 --threads 8 -b :8000\n'
+            'then run\n'
+            '  manage.py benchmark_login --p99 1000\n'
+            'and again with PASSWORD_HASH_WORKERS=0 to compare with inline '
+            'hashing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Base URL of the server.')
+        parser.add_argument('--user', default='bench-0',
+                            help='Username to log in as.')
+        parser.add_argument('--login', default=reverse('token_obtain_pair'),
+                            help='Path of the login endpoint, e.g. '
+                                 + reverse('async-login'))
+        parser.add_argument('--probe', default=reverse('posts'),
+                            help='Path loaded alongside the logins to show '
+                                 'their effect on other endpoints.')
+        parser.add_argument('--concurrency', type=int, action='append',
+                            help='Login concurrency levels to try; may be '
+                                 'given several times (default 1 to 64).')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Logins per concurrency level.')
+        parser.add_argument('--p99', type=float, default=1000.0,
+                            help='Login p99 latency target in milliseconds.')
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        body = {'username': options['user'], 'password': PASSWORD}
+        levels = options['concurrency'] or [1, 2, 4, 8, 16, 32, 64]
+
+        self.stdout.write(f'{"clients":>8}{"req/s":>10}{"p50":>10}{"p99":>10}'
+                          f'{"errors":>8}{"probe p99":>12}')
+        best = None
+        for concurrency in levels:
+            probe = {}
+            # Keep the probe running for as long as the logins do.
+            stop = threading.Event()
+
+            def run_probe():
+                latencies = []
+                while not stop.is_set():
+                    result = run_load([base_url + options['probe']], 2, 20)
+                    latencies.append(result['p99_ms'])
+                probe['p99_ms'] = max(latencies) if latencies else 0.0
+
+            thread = threading.Thread(target=run_probe)
+            thread.start()
+            try:
+                result = run_load(
+                    [base_url + options['login']], concurrency,
+                    options['requests'], method='POST', body=body)
+            finally:
+                stop.set()
+                thread.join()
+
+            self.stdout.write(
+                f'{concurrency:>8}{result["requests_per_second"]:>10.1f}'
+                f'{result["p50_ms"]:>10.1f}{result["p99_ms"]:>10.1f}'
+                f'{result["errors"]:>8}{probe["p99_ms"]:>12.1f}')
+            if result['errors'] == result['requests']:
+                raise CommandError('Every login failed; run seed_graph first '
+                                   'and disable throttling.')
+            if result['p99_ms'] <= options['p99'] and (
+                    best is None or
+                    result['requests_per_second'] > best['requests_per_second']):
+                best = result
+
+        if best is None:
+            self.stdout.write(f'\nNo level kept p99 under {options["p99"]:.0f} ms')
+        else:
+            self.stdout.write(
+                f'\n{best["requests_per_second"]:.1f} logins/s at p99 <= '
+                f'{options["p99"]:.0f} ms ({best["concurrency"]} clients, '
+                f'{best["errors"]} errors)')
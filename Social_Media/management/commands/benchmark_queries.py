@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Social_Media.models import User, Post, Comment, Like, SavedPost
+
+
+class Command(BaseCommand):
+    help = ('Print the query plan and average run time of the hot lookups '
+            'used by the views, to check that they use an index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Number of times each query is run.')
+
+    def get_queries(self):
+        post = Post.objects.order_by('-id').first()
+        user = User.objects.order_by('-id').first()
+        if post is None or user is None:
+            return []
+        return [
+            ('like exists (user, post)',
+             Like.objects.filter(user=user, post=post)),
+            ('saved post exists (user, post)',
+             SavedPost.objects.filter(user=user, post=post)),
+            ('comments of post by created_at',
+             Comment.objects.filter(post=post).order_by('-created_at', '-id')[:20]),
+            ('posts of user by created',
+             Post.objects.filter(user=user).order_by('-created', '-id')[:20]),
+            ('latest posts',
+             Post.objects.order_by('-created', '-id')[:20]),
+        ]
+
+    def handle(self, *args, **options):
+        queries = self.get_queries()
+        if not queries:
+            self.stdout.write(self.style.WARNING(
+                'No users or posts to benchmark against.'))
+            return
+        for name, queryset in queries:
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f'{elapsed * 1000:.3f} ms per query on {connection.vendor}\n')
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from Social_Media.models import User, Post, Comment
+from Social_Media.serializers import PostSerializer, CommentSerializer
+
+
+class Command(BaseCommand):
+    help = ('Time the serialization of large in-memory pages with the '
+            'default DRF list serializer, the fast list serializer and a '
+            'sparse fieldset. No database access is needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def build_rows(self, rows):
+        now = timezone.now()
+        user = User(id=1, username='bench', phone_number='+12025550000')
+        posts = [Post(id=i, user=user, title=f'title {i}',
+                      content='content ' * 20, created=now,
+                      num_post_likes=i, num_comments=i)
+                 for i in range(1, rows + 1)]
+        comments = [Comment(id=i, user=user, post=posts[i - 1],
+                            content='comment ' * 10, created_at=now)
+                    for i in range(1, rows + 1)]
+        return posts, comments
+
+    def time(self, render, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        posts, comments = self.build_rows(rows)
+        factory = APIRequestFactory()
+        full = Request(factory.get('/'))
+        sparse = Request(factory.get('/', {'fields': 'id,title,user'}))
+
+        self.stdout.write(f'{"serializer":<22}{"default":>12}{"fast":>12}'
+                          f'{"sparse":>12}{"speedup":>10}')
+        for name, serializer_class, instances, sparse_request in [
+                ('PostSerializer', PostSerializer, posts, sparse),
+                ('CommentSerializer', CommentSerializer, comments,
+                 Request(factory.get('/', {'fields': 'id,content,user'})))]:
+            def default():
+                context = {'request': full}
+                serializers.ListSerializer(
+                    child=serializer_class(context=context),
+                    context=context).to_representation(instances)
+
+            def fast():
+                serializer_class(instances, many=True,
+                                 context={'request': full}).data
+
+            def sparse_fields():
+                serializer_class(instances, many=True,
+                                 context={'request': sparse_request}).data
+
+            default_ms = self.time(default, repeat)
+            fast_ms = self.time(fast, repeat)
+            sparse_ms = self.time(sparse_fields, repeat)
+            self.stdout.write(
+                f'{name:<22}{default_ms:>10.1f}ms{fast_ms:>10.1f}ms'
+                f'{sparse_ms:>10.1f}ms{default_ms / fast_ms:>9.1f}x')
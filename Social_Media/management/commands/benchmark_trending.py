@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Social_Media.models import User, Post, Like
+from Social_Media.trending import compute_trending, get_trending
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic set of likes, time the trending scoring job and '
+            'the trending read path, then roll everything back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=1_000_000)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--hours', type=int, default=48,
+                            help='Spread the likes over this many hours.')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, likes, posts, hours, batch_size, **options):
+        num_users = -(-likes // posts)
+        now = timezone.now()
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            [User(username=f'bench-trending-{i}', phone_number=f'+1202{i:07d}')
+             for i in range(num_users)], batch_size=batch_size)
+        author = users[0]
+        post_rows = Post.objects.bulk_create(
+            [Post(user=author, title=f'bench {i}', content='bench')
+             for i in range(posts)], batch_size=batch_size)
+
+        batch = []
+        for index in range(likes):
+            batch.append(Like(
+                user=users[index // posts], post=post_rows[index % posts],
+                created=now - timedelta(seconds=random.uniform(0, hours * 3600))))
+            if len(batch) == batch_size:
+                Like.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Like.objects.bulk_create(batch)
+        self.stdout.write(
+            f'Seeded {likes} likes on {posts} posts in '
+            f'{time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        top = compute_trending(now)
+        self.stdout.write(
+            f'Scored {likes} likes in {time.perf_counter() - started:.2f}s '
+            f'({len(top)} posts cached)')
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            get_trending(20)
+        elapsed = (time.perf_counter() - started) / 1000
+        self.stdout.write(f'Read the trending list in {elapsed * 1e6:.1f}us')
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from Social_Media.uploads import cleanup, get_expiry
+
+
+class Command(BaseCommand):
+    help = ('Delete resumable uploads that were neither completed nor resumed '
+            'recently, with their partial files, and partial files left '
+            'without an upload. Meant to be run periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float,
+                            help='Age after which an upload is abandoned '
+                                 '(RESUMABLE_UPLOAD_EXPIRY_HOURS).')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['hours']) if options['hours'] \
+            else get_expiry()
+        uploads, orphans = cleanup(max_age)
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {uploads} abandoned uploads and {orphans} orphaned '
+            f'partial files.'))
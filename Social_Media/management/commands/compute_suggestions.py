@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from Social_Media import graph
+from Social_Media.models import User
+
+
+class Command(BaseCommand):
+    help = ('Compute friend-of-friend follow suggestions for every user in '
+            'batches and store them in the cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        batch, total = [], 0
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                graph.store_suggestions(graph.compute_suggestions(batch))
+                total += len(batch)
+                batch = []
+        if batch:
+            graph.store_suggestions(graph.compute_suggestions(batch))
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed suggestions for {total} users.'))
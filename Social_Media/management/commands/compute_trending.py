@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from Social_Media.trending import compute_trending
+
+
+class Command(BaseCommand):
+    help = ('Score recent likes and comments with time decay and cache the '
+            'top trending posts. Meant to be run periodically.')
+
+    def handle(self, *args, **options):
+        top = compute_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Cached {len(top)} trending posts.'))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Social_Media import export
+from Social_Media.models import User
+
+
+class Command(BaseCommand):
+    help = ("Stream a user's posts, comments, likes and saved posts as NDJSON "
+            "or CSV, optionally gzipped or bundled with their media files in "
+            "a zip archive. Memory use does not depend on the user's history.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', choices=export.FORMATS,
+                            default=export.NDJSON)
+        parser.add_argument('--types', nargs='+', choices=list(export.KINDS),
+                            help='Only export these kinds of rows.')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--media', action='store_true',
+                            help='Bundle the media files in a zip archive.')
+        parser.add_argument('--file', help='Write here instead of stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["username"]} does not exist.')
+        chunks, _, filename = export.export(
+            user.id, options['types'], options['output'],
+            compress=options['gzip'], media=options['media'])
+        if options['file'] is None:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['file'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f'Exported {user.username} to {options["file"]} '
+                          f'({filename}).')
@@ -0,0 +1,107 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, percent):
+    """
+    Return the `percent` percentile of a sorted list of values.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run_load(urls, concurrency, requests, token=None, timeout=30,
+             method='GET', body=None):
+    """
+    Send `requests` requests spread over `urls` from `concurrency` threads.
+
+    `body` is sent JSON-encoded with every request when given.
+
+    Returns a dict with the throughput, the latency percentiles in
+    milliseconds and the number of failed requests.
+    """
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+
+    def fetch(index):
+        request = Request(urls[index % len(urls)], data=data, headers=headers,
+                          method=method)
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status < 400
+        except (HTTPError, URLError, OSError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in results if not ok),
+        'requests_per_second': requests / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Drive concurrent GET requests against running servers and '
+            'compare their throughput and latency.\n\n'
+            'To compare the WSGI and ASGI stacks, start both servers, e.g.\n'
+            '  gunicorn confing.wsgi -w 4 -b :8000\n'
+            '  uvicorn confing.asgi:application --workers 4 --port 8001\n'
+            'then run\n'
+            '  manage.py loadtest --server wsgi=http://localhost:8000/api/posts/ '
+            '--server asgi=http://localhost:8001/api/async/posts/')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', action='append', required=True,
+            metavar='NAME=URL',
+            help='A named URL to load; may be given several times.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--token', help='JWT access token to send.')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for server in options['server']:
+            name, _, url = server.partition('=')
+            if not url:
+                url = name
+            results[name] = run_load(
+                [url], options['concurrency'], options['requests'],
+                token=options['token'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f'{"server":<12}{"req/s":>10}{"p50":>10}'
+                          f'{"p95":>10}{"p99":>10}{"errors":>8}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<12}{result["requests_per_second"]:>10.1f}'
+                f'{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                f'{result["p99_ms"]:>10.1f}{result["errors"]:>8}')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from Social_Media.activity import process_batch, prune, get_poll_interval
+
+# Seconds between two prunes of processed events while the log is idle.
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = ('Apply the side effects recorded in the activity log in batches. '
+            'Runs until interrupted; start it as a separate process with '
+            'ACTIVITY_WORKER=process. Events processed more than '
+            'ACTIVITY_RETENTION_DAYS ago are pruned when the log is idle.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no event is due.')
+        parser.add_argument('--batch-size', type=int,
+                            help='Events per transaction (ACTIVITY_BATCH_SIZE).')
+        parser.add_argument('--prune-only', action='store_true',
+                            help='Only prune processed events and exit, e.g. '
+                                 'from cron when the thread worker is used.')
+
+    def handle(self, *args, **options):
+        if options['prune_only']:
+            pruned = prune()
+            self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} events.'))
+            return
+        processed = pruned = 0
+        last_prune = None
+        while True:
+            try:
+                taken = process_batch(options['batch_size'])
+                if not taken and (last_prune is None or
+                                  time.monotonic() - last_prune >= PRUNE_INTERVAL):
+                    pruned += prune()
+                    last_prune = time.monotonic()
+            finally:
+                close_old_connections()
+            processed += taken
+            if taken:
+                continue
+            if options['once']:
+                break
+            time.sleep(get_poll_interval())
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} events, pruned {pruned}.'))
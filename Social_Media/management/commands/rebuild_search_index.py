@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from Social_Media import search
+
+
+class Command(BaseCommand):
+    help = 'Re-index every post and user in the full-text search index.'
+
+    def handle(self, *args, **options):
+        for kind, index in search.INDEXES.items():
+            search.rebuild(index)
+            self.stdout.write(self.style.SUCCESS(f'Re-indexed {kind}.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from Social_Media import activity, likes
+from Social_Media.models import User, Post, Comment, Like
+
+
+def count_of(queryset, field):
+    """
+    Build a subquery counting the rows of `queryset` whose `field` is the outer pk.
+    """
+    counts = (queryset.filter(**{field: OuterRef('pk')})
+              .order_by().values(field).annotate(total=Count('pk'))
+              .values('total'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ('Recompute num_post_likes, num_comments, num_followers and '
+            'num_following from the Like, Comment and following tables. '
+            'Buffered likes and pending activity events are applied first, '
+            'so their deltas do not land on the recounted values later.')
+
+    def handle(self, *args, **options):
+        likes.flush()
+        activity.drain()
+        Follow = User.following.through
+
+        posts = Post.objects.update(
+            num_post_likes=count_of(Like.objects.all(), 'post'),
+            num_comments=count_of(Comment.objects.all(), 'post'),
+        )
+        users = User.objects.update(
+            num_followers=count_of(Follow.objects.all(), 'to_user'),
+            num_following=count_of(Follow.objects.all(), 'from_user'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled counters for {posts} posts and {users} users.'))
@@ -0,0 +1,143 @@
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Social_Media import search
+from Social_Media.feed import get_fanout_threshold
+from Social_Media.models import (
+    User, Post, Comment, Like, SavedPost, TimelineEntry)
+
+Follow = User.following.through
+
+PASSWORD = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic social graph with bulk inserts for load tests. '
+            'Users are named bench-<n> and share the password "benchmark". '
+            'Follows are skewed so a few users get most of the followers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10,
+                            help='Posts per user.')
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Users followed by each user.')
+        parser.add_argument('--likes', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=20_000)
+        parser.add_argument('--saved', type=int, default=10_000)
+        parser.add_argument('--hours', type=int, default=48,
+                            help='Spread posts and activity over this many hours.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            self.seed(**options)
+        if search.is_supported():
+            for index in search.INDEXES.values():
+                search.rebuild(index)
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    def backdate(self, model, rows, field, now, hours, batch_size):
+        """
+        Spread the creation time of `rows` over the last `hours`.
+
+        auto_now_add overwrites the value on insert, so it is set afterwards.
+        """
+        for row in rows:
+            setattr(row, field,
+                    now - timedelta(seconds=random.uniform(0, hours * 3600)))
+        model.objects.bulk_update(rows, [field], batch_size=batch_size)
+
+    def seed(self, users, posts, follows, likes, comments, saved, hours,
+             batch_size, **options):
+        now = timezone.now()
+        offset = User.objects.filter(username__startswith='bench-').count()
+        password = make_password(PASSWORD)
+        user_rows = User.objects.bulk_create(
+            [User(username=f'bench-{offset + i}', password=password,
+                  phone_number=f'+1303{offset + i:07d}')
+             for i in range(users)], batch_size=batch_size)
+        user_ids = [user.id for user in user_rows]
+        self.stdout.write(f'{len(user_ids)} users')
+
+        # Zipf-like popularity: the n-th user is followed 1/n as often.
+        weights = [1 / rank for rank in range(1, len(user_ids) + 1)]
+        followers = defaultdict(list)
+        edges = []
+        for user_id in user_ids:
+            targets = set(random.choices(user_ids, weights, k=follows))
+            targets.discard(user_id)
+            for target in targets:
+                followers[target].append(user_id)
+                edges.append(Follow(from_user_id=user_id, to_user_id=target))
+        Follow.objects.bulk_create(edges, batch_size=batch_size)
+        self.stdout.write(f'{len(edges)} follows')
+
+        post_rows = Post.objects.bulk_create(
+            [Post(user_id=user_id, title=f'bench post {i}',
+                  content=f'synthetic post {i} by user {user_id}')
+             for user_id in user_ids for i in range(posts)],
+            batch_size=batch_size)
+        self.backdate(Post, post_rows, 'created', now, hours, batch_size)
+        self.stdout.write(f'{len(post_rows)} posts')
+
+        threshold = get_fanout_threshold()
+        entries = []
+        for post in post_rows:
+            recipients = [post.user_id]
+            if len(followers[post.user_id]) <= threshold:
+                recipients += followers[post.user_id]
+            entries += [TimelineEntry(user_id=user_id, post_id=post.id,
+                                      created=post.created)
+                        for user_id in recipients]
+            if len(entries) >= batch_size:
+                TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+                entries = []
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+        pairs = {(random.choice(user_ids), random.choice(post_rows))
+                 for _ in range(likes)}
+        like_rows = Like.objects.bulk_create(
+            [Like(user_id=user_id, post=post) for user_id, post in pairs],
+            batch_size=batch_size)
+        self.backdate(Like, like_rows, 'created', now, hours, batch_size)
+        self.stdout.write(f'{len(pairs)} likes')
+
+        comment_rows = [Comment(user_id=random.choice(user_ids),
+                                post=random.choice(post_rows),
+                                content=f'synthetic comment {i}')
+                        for i in range(comments)]
+        Comment.objects.bulk_create(comment_rows, batch_size=batch_size)
+        self.backdate(Comment, comment_rows, 'created_at', now, hours, batch_size)
+        self.stdout.write(f'{len(comment_rows)} comments')
+
+        saved_pairs = {(random.choice(user_ids), random.choice(post_rows).id)
+                       for _ in range(saved)}
+        SavedPost.objects.bulk_create(
+            [SavedPost(user_id=user_id, post_id=post_id)
+             for user_id, post_id in saved_pairs], batch_size=batch_size)
+        self.stdout.write(f'{len(saved_pairs)} saved posts')
+
+        num_following = Counter(edge.from_user_id for edge in edges)
+        for user in user_rows:
+            user.num_followers = len(followers[user.id])
+            user.num_following = num_following[user.id]
+        User.objects.bulk_update(user_rows, ['num_followers', 'num_following'],
+                                 batch_size=batch_size)
+        num_likes = Counter(post.id for _, post in pairs)
+        num_comments = Counter(comment.post.id for comment in comment_rows)
+        for post in post_rows:
+            post.num_post_likes = num_likes[post.id]
+            post.num_comments = num_comments[post.id]
+        Post.objects.bulk_update(post_rows, ['num_post_likes', 'num_comments'],
+                                 batch_size=batch_size)
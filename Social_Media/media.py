@@ -0,0 +1,204 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from .caching import invalidate_post, invalidate_user_posts
+from .models import User, Post
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png'}
+VIDEO_EXTENSIONS = {'mov', 'avi', 'mp4', 'webm', 'mkv'}
+
+_executor = None
+
+
+def get_executor():
+    """
+    Return the shared worker pool that processes uploaded media.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'MEDIA_WORKERS', 2),
+            thread_name_prefix='media')
+    return _executor
+
+
+def get_extension(name):
+    return os.path.splitext(name)[1].lstrip('.').lower()
+
+
+def submit(func, *args):
+    """
+    Run `func` on the worker pool once the current transaction commits.
+
+    With MEDIA_WORKERS set to 0 the job runs inline instead, which keeps
+    tests deterministic. Failures are logged either way.
+    """
+    def run():
+        close_old_connections()
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Media job %s%r failed', func.__name__, args)
+        finally:
+            close_old_connections()
+
+    if getattr(settings, 'MEDIA_WORKERS', 2) == 0:
+        transaction.on_commit(run)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run))
+
+
+@contextmanager
+def local_path(field_file):
+    """
+    Yield a filesystem path for a stored file, copying it locally if needed.
+    """
+    try:
+        yield field_file.path
+        return
+    except NotImplementedError:
+        pass
+    suffix = os.path.splitext(field_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with field_file.open('rb') as source:
+            for chunk in source.chunks():
+                tmp.write(chunk)
+        tmp.flush()
+        yield tmp.name
+
+
+def make_thumbnail(source, size):
+    """
+    Return a JPEG thumbnail of an image file no larger than `size`.
+    """
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=85)
+    return ContentFile(output.getvalue())
+
+
+def run_ffmpeg(*args):
+    ffmpeg = getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+    if shutil.which(ffmpeg) is None:
+        raise RuntimeError(f'{ffmpeg} is not installed')
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', *args],
+                   check=True, timeout=getattr(settings, 'FFMPEG_TIMEOUT', 600))
+
+
+def process_image(post, base):
+    size = getattr(settings, 'THUMBNAIL_SIZE', (320, 320))
+    with post.file.open('rb') as source:
+        post.thumbnail.save(base + '_thumb.jpg', make_thumbnail(source, size),
+                            save=False)
+
+
+def extract_poster(path, poster):
+    """
+    Write one frame of a video to `poster`.
+
+    The frame at one second skips fade-ins; videos shorter than that fall
+    back to their first frame.
+    """
+    try:
+        run_ffmpeg('-ss', '1', '-i', path, '-frames:v', '1', poster)
+    except subprocess.CalledProcessError:
+        pass
+    if not os.path.exists(poster) or not os.path.getsize(poster):
+        run_ffmpeg('-i', path, '-frames:v', '1', poster)
+
+
+def process_video(post, base):
+    height = getattr(settings, 'VIDEO_RENDITION_HEIGHT', 720)
+    size = getattr(settings, 'THUMBNAIL_SIZE', (320, 320))
+    with local_path(post.file) as path, tempfile.TemporaryDirectory() as tmp:
+        poster = os.path.join(tmp, 'poster.jpg')
+        rendition = os.path.join(tmp, 'rendition.mp4')
+        extract_poster(path, poster)
+        run_ffmpeg('-i', path, '-vf', f'scale=-2:min({height}\\,ih)',
+                   '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac',
+                   '-movflags', '+faststart', rendition)
+        with open(poster, 'rb') as source:
+            post.poster.save(base + '_poster.jpg', File(source), save=False)
+            source.seek(0)
+            post.thumbnail.save(base + '_thumb.jpg',
+                                make_thumbnail(source, size), save=False)
+        with open(rendition, 'rb') as source:
+            post.rendition.save(base + '_720p.mp4', File(source), save=False)
+
+
+def process_post_media(post_id):
+    """
+    Generate the thumbnail, poster and rendition of a post's file.
+    """
+    post = Post.objects.filter(id=post_id).first()
+    if post is None or not post.file:
+        return
+    Post.objects.filter(id=post_id).update(media_status=Post.MEDIA_PROCESSING)
+    base = os.path.splitext(os.path.basename(post.file.name))[0]
+    extension = get_extension(post.file.name)
+    try:
+        if extension in IMAGE_EXTENSIONS:
+            process_image(post, base)
+        elif extension in VIDEO_EXTENSIONS:
+            process_video(post, base)
+        status = Post.MEDIA_READY
+    except Exception:
+        logger.exception('Could not process media of post %s', post_id)
+        status = Post.MEDIA_FAILED
+    Post.objects.filter(id=post_id).update(
+        thumbnail=post.thumbnail.name or None,
+        poster=post.poster.name or None,
+        rendition=post.rendition.name or None,
+        media_status=status,
+    )
+    invalidate_post(post_id)
+
+
+def process_avatar(user_id):
+    """
+    Generate the thumbnail of a user's avatar.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None or not user.avatar:
+        return
+    size = getattr(settings, 'AVATAR_THUMBNAIL_SIZE', (96, 96))
+    base = os.path.splitext(os.path.basename(user.avatar.name))[0]
+    with user.avatar.open('rb') as source:
+        user.avatar_thumbnail.save(base + '_thumb.jpg',
+                                   make_thumbnail(source, size), save=False)
+    User.objects.filter(id=user_id).update(
+        avatar_thumbnail=user.avatar_thumbnail.name)
+    invalidate_user_posts(user_id)
+
+
+def schedule_post_media(post):
+    """
+    Queue derivative generation for a newly uploaded post file.
+    """
+    if post.file:
+        submit(process_post_media, post.id)
+
+
+def schedule_avatar(user):
+    """
+    Queue thumbnail generation for a newly uploaded avatar.
+    """
+    if user.avatar:
+        submit(process_avatar, user.id)
@@ -0,0 +1,238 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('Social_Media.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+_serializer_depth = contextvars.ContextVar('serializer_depth', default=0)
+
+
+class RequestStats:
+    """
+    Measurements collected while handling one request.
+    """
+
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.capture_sql = capture_sql
+        self.statements = []
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+
+
+class Registry:
+    """
+    Per-process aggregates of request metrics, keyed by URL name and method.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(RouteStats)
+
+    def observe(self, view, method, latency, stats, response_bytes):
+        with self.lock:
+            route = self.routes[(view, method)]
+            index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+            if index < len(LATENCY_BUCKETS):
+                route.buckets[index] += 1
+            route.count += 1
+            route.latency += latency
+            route.queries += stats.queries
+            route.sql_time += stats.sql_time
+            route.serializer_time += stats.serializer_time
+            route.response_bytes += response_bytes
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = [
+                '# HELP social_media_request_duration_seconds Request latency.',
+                '# TYPE social_media_request_duration_seconds histogram',
+            ]
+            for (view, method), route in routes:
+                labels = f'view="{view}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, route.buckets):
+                    cumulative += count
+                    lines.append(
+                        f'social_media_request_duration_seconds_bucket'
+                        f'{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'social_media_request_duration_seconds_bucket'
+                             f'{{{labels},le="+Inf"}} {route.count}')
+                lines.append(f'social_media_request_duration_seconds_sum'
+                             f'{{{labels}}} {route.latency}')
+                lines.append(f'social_media_request_duration_seconds_count'
+                             f'{{{labels}}} {route.count}')
+            counters = [
+                ('request_queries_total', 'SQL queries run.', 'queries'),
+                ('request_sql_seconds_total', 'Time spent in SQL.', 'sql_time'),
+                ('request_serializer_seconds_total',
+                 'Time spent serializing responses.', 'serializer_time'),
+                ('response_bytes_total', 'Response body size.', 'response_bytes'),
+            ]
+            for name, help_text, attribute in counters:
+                lines.append(f'# HELP social_media_{name} {help_text}')
+                lines.append(f'# TYPE social_media_{name} counter')
+                for (view, method), route in routes:
+                    lines.append(
+                        f'social_media_{name}{{view="{view}",method="{method}"}} '
+                        f'{getattr(route, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.sql_time += elapsed
+        if stats.capture_sql:
+            stats.statements.append((elapsed, sql))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Wrap every new database connection with `record_query`.
+
+    Installing the wrapper on the connection rather than per request means
+    queries run from async views through sync_to_async are counted too.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class SerializerTimingMixin:
+    """
+    Add the time spent in `to_representation` to the current request stats.
+
+    Only the outermost call is timed, so nested serializers are not counted
+    twice; list serializers add up the time of each item.
+    """
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        depth = _serializer_depth.get()
+        if stats is None or depth:
+            return super().to_representation(instance)
+        token = _serializer_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            _serializer_depth.reset(token)
+
+
+def get_slow_request_threshold():
+    """
+    Return the latency in seconds above which requests are logged, or None.
+    """
+    return getattr(settings, 'SLOW_REQUEST_THRESHOLD', None)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL and serializer time and response size per route.
+
+    Requests slower than SLOW_REQUEST_THRESHOLD are logged with their SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def start(self):
+        stats = RequestStats(capture_sql=get_slow_request_threshold() is not None)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        latency = time.perf_counter() - started
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, latency, stats, size)
+
+        threshold = get_slow_request_threshold()
+        if threshold is not None and latency >= threshold:
+            statements = sorted(stats.statements, reverse=True)
+            logger.warning(
+                'Slow request %s %s took %.3fs with %d queries (%.3fs SQL):\n%s',
+                request.method, request.get_full_path(), latency,
+                stats.queries, stats.sql_time,
+                '\n'.join(f'{elapsed:.4f}s {sql}' for elapsed, sql in statements))
+
+
+def metrics_view(request):
+    """
+    Serve the collected metrics to Prometheus.
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
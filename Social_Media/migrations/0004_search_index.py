@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# The index layout is frozen here instead of being read from
+# Social_Media.search, so later changes to that module cannot alter what
+# this migration creates.
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS social_media_post_search '
+    'USING fts5(title, content, tokenize="unicode61")',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS social_media_user_search '
+    'USING fts5(username, bio, tokenize="unicode61")',
+    'INSERT INTO social_media_post_search (rowid, title, content) '
+    'SELECT id, COALESCE(title, \'\'), COALESCE(content, \'\') '
+    'FROM "Social_Media_post"',
+    'INSERT INTO social_media_user_search (rowid, username, bio) '
+    'SELECT id, COALESCE(username, \'\'), COALESCE(bio, \'\') '
+    'FROM "Social_Media_user"',
+]
+
+POSTGRES_FORWARD = [
+    'CREATE TABLE IF NOT EXISTS social_media_post_search ('
+    'id bigint PRIMARY KEY REFERENCES "Social_Media_post" (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS social_media_post_search_document_idx '
+    'ON social_media_post_search USING GIN (document)',
+    'CREATE TABLE IF NOT EXISTS social_media_user_search ('
+    'id bigint PRIMARY KEY REFERENCES "Social_Media_user" (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS social_media_user_search_document_idx '
+    'ON social_media_user_search USING GIN (document)',
+    'INSERT INTO social_media_post_search (id, document) '
+    'SELECT id, setweight(to_tsvector(\'english\', COALESCE(title, \'\')), \'A\') || '
+    'setweight(to_tsvector(\'english\', COALESCE(content, \'\')), \'B\') '
+    'FROM "Social_Media_post" ON CONFLICT (id) DO NOTHING',
+    'INSERT INTO social_media_user_search (id, document) '
+    'SELECT id, setweight(to_tsvector(\'english\', COALESCE(username, \'\')), \'A\') || '
+    'setweight(to_tsvector(\'english\', COALESCE(bio, \'\')), \'B\') '
+    'FROM "Social_Media_user" ON CONFLICT (id) DO NOTHING',
+]
+
+BACKWARD = [
+    'DROP TABLE IF EXISTS social_media_post_search',
+    'DROP TABLE IF EXISTS social_media_user_search',
+]
+
+FORWARD = {
+    'sqlite': SQLITE_FORWARD,
+    'postgresql': POSTGRES_FORWARD,
+}
+
+
+def create_search_index(apps, schema_editor):
+    for statement in FORWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in FORWARD:
+        for statement in BACKWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Social_Media', '0003_upload'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
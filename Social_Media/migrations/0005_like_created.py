@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:15
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_like_created(apps, schema_editor):
+    # A like cannot be older than its post, so existing likes are dated
+    # with their post instead of the time of the migration, which would
+    # make all of them trend at once.
+    Like = apps.get_model('Social_Media', 'Like')
+    Post = apps.get_model('Social_Media', 'Post')
+    Like.objects.update(created=Subquery(
+        Post.objects.filter(pk=OuterRef('post')).values('created')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Social_Media', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='like',
+            name='created',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_like_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='like',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created'], name='like_created_idx'),
+        ),
+    ]
@@ -1,11 +1,16 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import FileExtensionValidator
+from django.utils import timezone
 
 
 class User(AbstractUser):
     avatar = models.ImageField(blank=True, null=True)
+    avatar_thumbnail = models.ImageField(
+        blank=True, null=True, upload_to='thumbnails/')
     bio = models.CharField(max_length=100, null=True, blank=True)
     phone_number = PhoneNumberField(null=False, blank=False, unique=True)
     num_followers = models.IntegerField(default=0)
@@ -18,16 +23,44 @@ class User(AbstractUser):
 
 
 class Post(models.Model):
+    MEDIA_NONE = 'none'
+    MEDIA_PENDING = 'pending'
+    MEDIA_PROCESSING = 'processing'
+    MEDIA_READY = 'ready'
+    MEDIA_FAILED = 'failed'
+    MEDIA_STATUS_CHOICES = [
+        (MEDIA_NONE, 'No media'),
+        (MEDIA_PENDING, 'Pending'),
+        (MEDIA_PROCESSING, 'Processing'),
+        (MEDIA_READY, 'Ready'),
+        (MEDIA_FAILED, 'Failed'),
+    ]
+
     user = models .ForeignKey(
         User, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=20)
     content = models.TextField()
     file = models.FileField(null=True, blank=True, validators=[FileExtensionValidator(
         allowed_extensions=['MOV', 'avi', 'mp4', 'webm', 'mkv', 'jpg', 'png'])])
+    thumbnail = models.ImageField(
+        null=True, blank=True, upload_to='thumbnails/')
+    poster = models.ImageField(null=True, blank=True, upload_to='posters/')
+    rendition = models.FileField(
+        null=True, blank=True, upload_to='renditions/')
+    media_status = models.CharField(
+        max_length=10, choices=MEDIA_STATUS_CHOICES, default=MEDIA_NONE)
     created = models.DateTimeField(auto_now_add=True)
     num_post_likes = models.IntegerField(default=0)
     num_comments = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='post_created_idx'),
+            models.Index(fields=['user', '-created', '-id'],
+                         name='post_user_created_idx'),
+        ]
+
 
 class Comment(models.Model):
     user = models .ForeignKey(
@@ -37,12 +70,29 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['created_at'], name='comment_created_idx'),
+        ]
+
 
 class Like(models.Model):
     user = models .ForeignKey(
         User, on_delete=models.CASCADE, related_name='likes')
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name='likes')
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_like'),
+        ]
+        indexes = [
+            models.Index(fields=['created'], name='like_created_idx'),
+        ]
 
 
 class SavedPost(models.Model):
@@ -50,3 +100,79 @@ class SavedPost(models.Model):
         User, on_delete=models.CASCADE, related_name='SavedPosts')
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name='SavedPosts')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_saved_post'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    A materialized row of a user's home timeline.
+
+    Rows are written when a post is fanned out to the followers of its
+    author, so reading a feed is a range scan over (user, created).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created', '-post']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created', '-post'],
+                         name='timeline_user_created_idx'),
+        ]
+
+
+class Upload(models.Model):
+    """
+    A resumable upload of a large post file.
+
+    Chunks are appended to a temporary file until `offset` reaches `length`,
+    then the file is moved into storage and attached to `post`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='uploads')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(null=True, blank=True)
+
+
+class Activity(models.Model):
+    """
+    An append-only log of writes whose side effects run in the background.
+
+    A row is inserted in the same transaction as the write it describes,
+    so a committed write always has its event and a rolled back one never
+    does. Workers mark rows `processed` in the transaction that applies
+    their side effects; `key` makes recording the same event twice a no-op.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    processed = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'],
+                         condition=models.Q(processed__isnull=True),
+                         name='activity_pending_idx'),
+        ]
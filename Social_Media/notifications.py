@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+class InProcessBus:
+    """
+    Deliver events to the subscribers of this process.
+
+    Events are published from worker threads and handed to the event loop
+    of each subscriber, so this only reaches WebSockets served by the same
+    process as the write. Use the Redis bus with more than one process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(
+                subscription.queue.put_nowait, (channel, event))
+
+    async def subscribe(self, channels):
+        subscription = InProcessSubscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].discard(subscription)
+                if not self.subscribers[channel]:
+                    del self.subscribers[channel]
+
+
+class InProcessSubscription:
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        self.bus.unsubscribe(self)
+
+
+class RedisBus:
+    """
+    Deliver events through Redis pub/sub, to subscribers of every process.
+    """
+    prefix = 'notifications:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'The redis notification bus requires the redis package.')
+        if not url:
+            raise ImproperlyConfigured(
+                'Set NOTIFICATIONS_REDIS_URL to use the redis notification bus.')
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    async def subscribe(self, channels):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[self.prefix + channel for channel in channels])
+        return RedisSubscription(self, client, pubsub)
+
+
+class RedisSubscription:
+    def __init__(self, bus, client, pubsub):
+        self.bus = bus
+        self.client = client
+        self.pubsub = pubsub
+        self.messages = pubsub.listen()
+
+    async def get(self):
+        async for message in self.messages:
+            if message['type'] == 'message':
+                channel = message['channel'].decode()[len(self.bus.prefix):]
+                return channel, json.loads(message['data'])
+        raise ConnectionError('The Redis subscription was closed.')
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """
+    Return the event bus selected by NOTIFICATIONS_BUS.
+    """
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            name = getattr(settings, 'NOTIFICATIONS_BUS', 'memory')
+            if name == 'memory':
+                _bus = InProcessBus()
+            elif name == 'redis':
+                _bus = RedisBus(getattr(settings, 'NOTIFICATIONS_REDIS_URL', None))
+            else:
+                raise ImproperlyConfigured(
+                    f'Unknown notification bus {name!r}; use "memory" or "redis".')
+        return _bus
+
+
+class EventBatch:
+    """
+    Events waiting to be sent to one subscriber.
+
+    Counter changes of the same object and field are summed into a single
+    update. Other events are kept in order, dropping the oldest past
+    NOTIFICATIONS_MAX_PENDING.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.events = deque(maxlen=getattr(settings, 'NOTIFICATIONS_MAX_PENDING', 100))
+
+    def add(self, channel, event):
+        if event['type'] == 'counter':
+            key = (event['object'], event['id'], event['field'])
+            self.counters[key] = self.counters.get(key, 0) + event['delta']
+        else:
+            self.events.append(dict(event, channel=channel))
+
+    def drain(self):
+        """
+        Return the pending events as a list and empty the batch.
+        """
+        events = list(self.events)
+        events += [
+            {'type': 'counter', 'object': kind, 'id': pk,
+             'field': field, 'delta': delta}
+            for (kind, pk, field), delta in self.counters.items() if delta]
+        self.events.clear()
+        self.counters.clear()
+        return events
+
+
+def publish(channel, event):
+    """
+    Publish an event once the current transaction commits.
+
+    Notifications are best effort: a failing bus is logged and does not
+    affect the write that triggered it.
+    """
+    def send():
+        try:
+            get_bus().publish(channel, event)
+        except Exception:
+            logger.exception('Could not publish a notification to %s', channel)
+
+    transaction.on_commit(send)
+
+
+def counter(kind, pk, field, delta):
+    return {'type': 'counter', 'object': kind, 'id': pk,
+            'field': field, 'delta': delta}
+
+
+def notify_like(user_id, post_id, author_id):
+    publish(post_channel(post_id), counter('post', post_id, 'num_post_likes', 1))
+    if author_id != user_id:
+        publish(user_channel(author_id),
+                {'type': 'like', 'post': post_id, 'user': user_id})
+
+
+def notify_comment(comment, author_id):
+    post_id = comment.post_id
+    publish(post_channel(post_id), counter('post', post_id, 'num_comments', 1))
+    publish(post_channel(post_id), {'type': 'comment', 'post': post_id,
+                                    'comment': comment.id,
+                                    'user': comment.user_id})
+    if author_id != comment.user_id:
+        publish(user_channel(author_id),
+                {'type': 'comment', 'post': post_id, 'comment': comment.id,
+                 'user': comment.user_id})
+
+
+def notify_comment_deleted(post_id):
+    publish(post_channel(post_id), counter('post', post_id, 'num_comments', -1))
+
+
+def notify_follow(user_id, followed_id, following=True):
+    """
+    Tell a user they gained or lost a follower.
+    """
+    publish(user_channel(followed_id),
+            counter('user', followed_id, 'num_followers', 1 if following else -1))
+    if following:
+        publish(user_channel(followed_id), {'type': 'follow', 'user': user_id})
@@ -0,0 +1,155 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination over a composite descending key.
+
+    Instead of an OFFSET, each page is selected with a keyset filter on the
+    last row of the previous page, so every page costs the same as the first.
+    The ordering fields should be covered by an index and the last one must
+    be unique.
+    """
+    ordering = ('id',)
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        queryset = queryset.order_by(*['-' + field for field in self.ordering])
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def paginate_results(self, fetch, model, request):
+        """
+        Paginate results that are not a single queryset, such as a merged feed.
+
+        `fetch` is called with the page size plus one and the decoded position,
+        and must return rows in the same order as `ordering`.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = model
+        results = list(fetch(self.page_size + 1, self.decode_cursor(request)))
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_keyset_filter(self, position):
+        """
+        Build a filter selecting the rows that sort strictly after `position`.
+
+        For a key (a, b) this is `a < x OR (a = x AND b < y)`.
+        """
+        keyset_filter = Q()
+        for index, field in enumerate(self.ordering):
+            clause = Q(**{field + '__lt': position[index]})
+            for previous, value in zip(self.ordering[:index], position):
+                clause &= Q(**{previous: value})
+            keyset_filter |= clause
+        return keyset_filter
+
+    def get_position(self, instance):
+        return [getattr(instance, field) for field in self.ordering]
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value
+                  for value in position]
+        encoded = base64.urlsafe_b64encode(json.dumps(values).encode('ascii'))
+        return encoded.decode('ascii')
+
+    def decode_cursor(self, request):
+        """
+        Return the keyset position encoded in the request cursor, if any.
+
+        Cursors that do not decode to one non-null value per ordering field
+        are answered with a 404.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            position = [self.to_python(field, value)
+                        for field, value in zip(self.ordering, values)]
+            if None in position:
+                raise ValueError
+            return position
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, field, value):
+        return self.model._meta.get_field(field).to_python(value)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+
+class PostPagination(KeysetPagination):
+    ordering = ('created', 'id')
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class SearchPagination(KeysetPagination):
+    ordering = ('score', 'id')
+
+    def to_python(self, field, value):
+        return float(value) if field == 'score' else int(value)
@@ -0,0 +1,115 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def get_related_paths(serializer, prefix=''):
+    """
+    Work out which relations a serializer will traverse while rendering.
+
+    Returns a (select_related, prefetch_related) pair of lookup paths.
+    Forward foreign keys rendered through a related field or a nested
+    serializer are joined; many-valued relations are prefetched. Primary key
+    fields read the `_id` column and need neither.
+    """
+    select_related, prefetch_related = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*' or '.' in field.source:
+            continue
+        path = prefix + field.source
+        if isinstance(field, (serializers.ManyRelatedField,
+                              serializers.ListSerializer)):
+            prefetch_related.append(path)
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        elif isinstance(field, serializers.RelatedField):
+            select_related.append(path)
+        elif isinstance(field, serializers.BaseSerializer):
+            select_related.append(path)
+            nested_select, nested_prefetch = get_related_paths(
+                field, prefix=path + '__')
+            select_related.extend(nested_select)
+            prefetch_related.extend(nested_prefetch)
+    return select_related, prefetch_related
+
+
+def get_only_fields(serializer, prefix=''):
+    """
+    Work out which columns a serializer reads, for `QuerySet.only()`.
+
+    Nested serializers add the columns of their relation. Returns None when
+    a field reads something other than a model field, such as a property
+    or the whole instance, in which case every column must be loaded.
+    """
+    model = serializer.Meta.model
+    columns = {field.name: field for field in model._meta.get_fields()}
+    only = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        column = columns.get(field.source)
+        if column is None:
+            return None
+        if column.many_to_many or column.one_to_many:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            nested = get_only_fields(field, prefix=prefix + field.source + '__')
+            if nested is None:
+                return None
+            only.extend(nested)
+        elif isinstance(field, serializers.RelatedField) and \
+                not isinstance(field, serializers.PrimaryKeyRelatedField):
+            # Rendered from the whole related object, e.g. with str().
+            return None
+        only.append(prefix + field.source)
+    return only
+
+
+class PrefetchRelatedMixin:
+    """
+    Apply `select_related`/`prefetch_related` to a view's queryset.
+
+    Views may declare `select_related_fields` and `prefetch_related_fields`
+    explicitly; the relations traversed by the view's serializer are added
+    automatically, so a list renders in a constant number of queries.
+
+    When a read asks for a sparse fieldset with `?fields=`, only the columns
+    the serializer renders are selected.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_related_fields(self):
+        select_related, prefetch_related = get_related_paths(
+            self.get_serializer())
+        select_related = list(self.select_related_fields) + select_related
+        prefetch_related = list(self.prefetch_related_fields) + prefetch_related
+        return list(dict.fromkeys(select_related)), list(dict.fromkeys(prefetch_related))
+
+    def get_only_fields(self):
+        request = self.request
+        if request.method not in SAFE_METHODS or \
+                not request.query_params.get('fields'):
+            return None
+        serializer = self.get_serializer()
+        only = get_only_fields(serializer)
+        if only is None:
+            return None
+        # The paginator reads the ordering columns to build the next cursor.
+        columns = {field.name for field in serializer.Meta.model._meta.concrete_fields}
+        ordering = getattr(self.paginator, 'ordering', ())
+        return only + [field for field in ordering
+                       if field in columns and field not in only]
+
+    def optimize_queryset(self, queryset):
+        select_related, prefetch_related = self.get_related_fields()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        only = self.get_only_fields()
+        if only:
+            queryset = queryset.only(*only)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        return self.optimize_queryset(super().filter_queryset(queryset))
@@ -0,0 +1,154 @@
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from . import caching
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def get_replicas():
+    """
+    Return the aliases of the read replicas listed in DATABASE_REPLICAS.
+    """
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_sticky_seconds():
+    """
+    Return how long a client reads from the primary after writing.
+    """
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+class ReplicaRouter:
+    """
+    Send reads to a random replica while a request allows it.
+
+    Only requests marked by ReplicaRoutingMiddleware read from replicas;
+    management commands, background threads and open transactions always
+    use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not _use_replica.get() or \
+                connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, even during a replica request.
+
+    Used where results are cached for other clients: a lagging replica would
+    otherwise store data older than the write that invalidated the entry.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def client_key(request):
+    """
+    Identify the client of a request for read-your-writes stickiness.
+
+    The user id is read from the JWT without verifying it: a forged token
+    can at most send its own reads to the primary. Clients without a token
+    are keyed by their address.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(header) == 2:
+        try:
+            payload = jwt.decode(header[1], options={'verify_signature': False})
+            return f'user:{payload[api_settings.USER_ID_CLAIM]}'
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    address = request.META.get('REMOTE_ADDR', '')
+    return 'addr:' + hashlib.md5(address.encode(), usedforsecurity=False).hexdigest()
+
+
+def _pin_key(request):
+    return f'replica:pin:{client_key(request)}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe requests read from replicas, except right after a write.
+
+    An unsafe request pins its client to the primary for
+    REPLICA_STICKY_SECONDS, so the client reads its own writes even if the
+    replicas lag behind.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replica.set(self.use_replica(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+    async def __acall__(self, request):
+        token = _use_replica.set(self.use_replica(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+    def use_replica(self, request):
+        if not get_replicas():
+            return False
+        if request.method not in SAFE_METHODS:
+            caching.get_cache().set(
+                _pin_key(request), True, timeout=get_sticky_seconds())
+            return False
+        return caching.get_cache().get(_pin_key(request)) is None
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Switch SQLite databases to write-ahead logging when SQLITE_WAL is set.
+
+    WAL lets readers run while a write is in progress, so a second alias on
+    the same file can stand in for a read replica locally.
+    """
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_WAL', False):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
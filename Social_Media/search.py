@@ -0,0 +1,206 @@
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from .models import User, Post
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchIndex:
+    """
+    Describes one full-text index: its table, source model and columns.
+
+    Columns are listed with their weight; earlier columns weigh more.
+    """
+
+    def __init__(self, table, model, columns):
+        self.table = table
+        self.model = model
+        self.columns = columns
+
+    def values(self, instance):
+        return [getattr(instance, column) or '' for column, _ in self.columns]
+
+
+POST_INDEX = SearchIndex('social_media_post_search', Post,
+                         [('title', 2.0), ('content', 1.0)])
+USER_INDEX = SearchIndex('social_media_user_search', User,
+                         [('username', 2.0), ('bio', 1.0)])
+INDEXES = {'posts': POST_INDEX, 'users': USER_INDEX}
+
+
+class SQLiteBackend:
+    """
+    Full-text search on SQLite with an FTS5 table ranked by BM25.
+
+    The FTS5 rowid is the primary key of the indexed row.
+    """
+
+    def create(self, cursor, index):
+        columns = ', '.join(column for column, _ in index.columns)
+        cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {index.table} '
+                       f'USING fts5({columns}, tokenize="unicode61")')
+
+    def drop(self, cursor, index):
+        cursor.execute(f'DROP TABLE IF EXISTS {index.table}')
+
+    def upsert(self, cursor, index, pk, values):
+        self.delete(cursor, index, pk)
+        columns = ', '.join(column for column, _ in index.columns)
+        placeholders = ', '.join(['%s'] * (len(values) + 1))
+        cursor.execute(
+            f'INSERT INTO {index.table} (rowid, {columns}) '
+            f'VALUES ({placeholders})', [pk, *values])
+
+    def delete(self, cursor, index, pk):
+        cursor.execute(f'DELETE FROM {index.table} WHERE rowid = %s', [pk])
+
+    def build_query(self, tokens):
+        return ' '.join('"{}"'.format(token.replace('"', '')) for token in tokens)
+
+    def search(self, cursor, index, tokens, limit, before):
+        weights = ', '.join(str(weight) for _, weight in index.columns)
+        sql = (f'SELECT id, score FROM ('
+               f'SELECT rowid AS id, -bm25({index.table}, {weights}) AS score '
+               f'FROM {index.table} WHERE {index.table} MATCH %s)')
+        params = [self.build_query(tokens)]
+        if before is not None:
+            sql += ' WHERE score < %s OR (score = %s AND id < %s)'
+            params += [before[0], before[0], before[1]]
+        sql += ' ORDER BY score DESC, id DESC LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+class PostgresBackend:
+    """
+    Full-text search on Postgres with a weighted tsvector and a GIN index,
+    ranked by ts_rank_cd.
+    """
+    config = 'english'
+    labels = 'ABCD'
+
+    def create(self, cursor, index):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {index.table} ('
+            f'id bigint PRIMARY KEY REFERENCES "{index.model._meta.db_table}" (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index.table}_document_idx '
+            f'ON {index.table} USING GIN (document)')
+
+    def drop(self, cursor, index):
+        cursor.execute(f'DROP TABLE IF EXISTS {index.table}')
+
+    def upsert(self, cursor, index, pk, values):
+        document = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{label}')"
+            for label, _ in zip(self.labels, index.columns))
+        cursor.execute(
+            f'INSERT INTO {index.table} (id, document) VALUES (%s, {document}) '
+            f'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+            [pk, *values])
+
+    def delete(self, cursor, index, pk):
+        cursor.execute(f'DELETE FROM {index.table} WHERE id = %s', [pk])
+
+    def search(self, cursor, index, tokens, limit, before):
+        weights = [0.1] * 4
+        for position, (_, weight) in enumerate(index.columns):
+            weights[3 - position] = min(1.0, weight / 2)
+        sql = (f'SELECT id, score FROM ('
+               f'SELECT id, ts_rank_cd(%s::float4[], document, query)::float8 AS score '
+               f'FROM {index.table}, plainto_tsquery(\'{self.config}\', %s) query '
+               f'WHERE document @@ query) ranked')
+        params = [weights, ' '.join(tokens)]
+        if before is not None:
+            sql += ' WHERE score < %s OR (score = %s AND id < %s)'
+            params += [before[0], before[0], before[1]]
+        sql += ' ORDER BY score DESC, id DESC LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(vendor=None):
+    """
+    Return the search backend for the database in use.
+    """
+    vendor = vendor or connection.vendor
+    try:
+        return BACKENDS[vendor]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f'Full-text search is not supported on {vendor}.')
+
+
+def is_supported(vendor=None):
+    return (vendor or connection.vendor) in BACKENDS
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def index_instance(index, instance):
+    """
+    Add or refresh one row in a full-text index.
+    """
+    with connection.cursor() as cursor:
+        get_backend().upsert(cursor, index, instance.pk, index.values(instance))
+
+
+def remove_instance(index, pk):
+    """
+    Remove one row from a full-text index.
+    """
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, index, pk)
+
+
+def rebuild(index, batch_size=1000):
+    """
+    Index every row of the model of `index`.
+    """
+    backend = get_backend()
+    fields = ['pk'] + [column for column, _ in index.columns]
+    rows = index.model.objects.values_list(*fields).iterator(chunk_size=batch_size)
+    with connection.cursor() as cursor:
+        for pk, *values in rows:
+            backend.upsert(cursor, index, pk, [value or '' for value in values])
+
+
+def search(kind, query, limit=20, before=None):
+    """
+    Return up to `limit` instances matching `query`, best match first.
+
+    Each instance gets a `score` attribute; higher scores rank higher.
+
+    Parameters:
+    - kind: 'posts' or 'users'.
+    - query: The text typed by the user; every word must match.
+    - limit: The maximum number of results.
+    - before: An optional (score, id) pair; only lower-ranked results are returned.
+    """
+    index = INDEXES[kind]
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    with connection.cursor() as cursor:
+        hits = get_backend().search(cursor, index, tokens, limit, before)
+    instances = index.model.objects.in_bulk([pk for pk, _ in hits])
+    results = []
+    for pk, score in hits:
+        instance = instances.get(pk)
+        if instance is not None:
+            instance.score = score
+            results.append(instance)
+    return results
@@ -1,10 +1,132 @@
+from operator import attrgetter
+
 import django.db
 import django.urls
-from .models import User, Post, Comment, Like, SavedPost
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import File
+from django.conf import settings
+from django.db import models
+from .models import User, Post, Comment, Like, SavedPost, Upload
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PKOnlyObject
+from .metrics import SerializerTimingMixin
+
+# Columns holding plain Python values, which the serializer fields in
+# PLAIN_FIELDS render unchanged. Custom columns (e.g. phone numbers) are
+# converted by their serializer field.
+PLAIN_COLUMNS = (models.AutoField, models.BigAutoField, models.CharField,
+                 models.TextField, models.IntegerField, models.BigIntegerField,
+                 models.PositiveIntegerField, models.BooleanField,
+                 models.FloatField)
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField,
+                serializers.BooleanField, serializers.FloatField,
+                serializers.ReadOnlyField)
+# Serializer fields converting a value without looking at the instance.
+CONVERTED_FIELDS = (serializers.CharField, serializers.IntegerField,
+                    serializers.BooleanField, serializers.FloatField,
+                    serializers.DateTimeField, serializers.ChoiceField,
+                    serializers.FileField)
+
+
+def parse_field_list(request, name):
+    """
+    Return the comma separated names of a query parameter as a set.
+    """
+    value = request.query_params.get(name, '')
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def _convert_field(field, getter):
+    def convert(instance):
+        value = getter(instance)
+        return None if value is None else field.to_representation(value)
+    return convert
+
+
+def _convert_generic(field):
+    def convert(instance):
+        attribute = field.get_attribute(instance)
+        check_for_none = (attribute.pk if isinstance(attribute, PKOnlyObject)
+                          else attribute)
+        return None if check_for_none is None else field.to_representation(attribute)
+    return convert
+
+
+class FastListSerializer(SerializerTimingMixin, serializers.ListSerializer):
+    """
+    A list serializer with a faster read path.
+
+    The fields of the child are inspected once per list rather than once
+    per row. Columns are then read with plain attribute getters. Primary
+    key relations come from their `_id` attribute, and plain values are
+    used as they are. Other fields go through DRF as usual. Writes are
+    unchanged.
+    """
+
+    def get_plan(self):
+        """
+        Return a (name, converter) pair per readable field of the child.
+        """
+        columns = {field.name: field
+                   for field in self.child.Meta.model._meta.concrete_fields}
+        plan = []
+        for field in self.child._readable_fields:
+            column = columns.get(field.source)
+            if column is None:
+                plan.append((field.field_name, _convert_generic(field)))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and \
+                    field.pk_field is None:
+                plan.append((field.field_name, attrgetter(column.attname)))
+            elif type(field) in PLAIN_FIELDS and type(column) in PLAIN_COLUMNS:
+                plan.append((field.field_name, attrgetter(column.attname)))
+            elif isinstance(field, CONVERTED_FIELDS):
+                plan.append((field.field_name,
+                             _convert_field(field, attrgetter(column.attname))))
+            else:
+                plan.append((field.field_name, _convert_generic(field)))
+        return plan
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        plan = self.get_plan()
+        return [{name: convert(item) for name, convert in plan}
+                for item in iterable]
+
+
+class ModelSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    """
+    Base serializer whose representation time is reported in the metrics.
+
+    On safe requests the top-level serializer honours two query parameters:
+    - fields: A comma separated list of the fields to render.
+    - expand: Relations to render as nested objects instead of ids, among
+      the names listed in `Meta.expandable`.
+    """
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or \
+                not self.is_root():
+            return fields
+        expandable = getattr(self.Meta, 'expandable', {})
+        for name in parse_field_list(request, 'expand') & expandable.keys():
+            fields[name] = expandable[name](read_only=True)
+        only = parse_field_list(request, 'fields')
+        if only:
+            fields = {name: field for name, field in fields.items()
+                      if name in only}
+        return fields
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={
                                      'input_type': 'password'})
     date_joined = serializers.DateTimeField(read_only=True)
@@ -15,32 +137,53 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         exclude = ('last_login', 'groups', 'user_permissions',
                    'is_staff', 'is_active', 'is_superuser')
+        read_only_fields = ('avatar_thumbnail',)
+        list_serializer_class = FastListSerializer
+
+
+POST_MEDIA_FIELDS = ('thumbnail', 'poster', 'rendition', 'media_status')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'bio', 'avatar', 'avatar_thumbnail',
+                  'num_followers', 'num_following')
+        read_only_fields = fields
+        list_serializer_class = FastListSerializer
+
+
+class PostSerializer(ModelSerializer):
     class Meta:
         model = Post
         fields = "__all__"
+        read_only_fields = POST_MEDIA_FIELDS
+        list_serializer_class = FastListSerializer
+        expandable = {'user': UserSummarySerializer}
 
 
-class PostRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
+class PostRetrieveUpdateDestroySerializer(ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = Post
         fields = "__all__"
+        read_only_fields = POST_MEDIA_FIELDS
         extra_kwargs = {
             "user": {"read_only": True},
         }
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(ModelSerializer):
     class Meta:
         model = Comment
         fields = "__all__"
+        read_only_fields = ('user',)
+        list_serializer_class = FastListSerializer
+        expandable = {'user': UserSummarySerializer, 'post': PostSerializer}
 
 
-class CommentRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
+class CommentRetrieveUpdateDestroySerializer(ModelSerializer):
     user = serializers.StringRelatedField()
     post = serializers.StringRelatedField()
 
@@ -53,17 +196,19 @@ class CommentRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
         }
 
 
-class SavedPostSerializer(serializers.ModelSerializer):
+class SavedPostSerializer(ModelSerializer):
     # user = serializers.StringRelatedField()
     # post = serializers.StringRelatedField()
     class Meta:
         model = SavedPost
         fields = "__all__"
+        list_serializer_class = FastListSerializer
+        expandable = {'user': UserSummarySerializer, 'post': PostSerializer}
 
 
-class SavedPostRetrieveDestroySerializer(serializers.ModelSerializer):
+class SavedPostRetrieveDestroySerializer(ModelSerializer):
     user = serializers.StringRelatedField()
-    post = serializers.StringRelatedField()
+    post = PostRetrieveUpdateDestroySerializer(read_only=True)
 
     class Meta:
         model = SavedPost
@@ -74,12 +219,61 @@ class SavedPostRetrieveDestroySerializer(serializers.ModelSerializer):
         }
 
 
-class LikePostSerializer(serializers.ModelSerializer):
+class LikePostSerializer(ModelSerializer):
     class Meta:
         model = Like
         fields = "__all__"
+        read_only_fields = ('user', 'created')
+        list_serializer_class = FastListSerializer
+        expandable = {'user': UserSummarySerializer}
 
 
 
 class FollowSerializer(serializers.Serializer):
-    pass
\ No newline at end of file
+    pass
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
+
+    def validate_ids(self, value):
+        max_items = self.context.get('max_items')
+        if max_items is not None and len(value) > max_items:
+            raise serializers.ValidationError(
+                f'At most {max_items} ids can be sent in one request.')
+        return value
+
+
+class UploadSerializer(ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ('id', 'post', 'filename', 'length', 'offset',
+                  'created', 'completed')
+        read_only_fields = ('offset', 'created', 'completed')
+
+    def validate_post(self, value):
+        if value.user != self.context['request'].user:
+            raise serializers.ValidationError(
+                'Files can only be uploaded to your own posts.')
+        return value
+
+    def validate_filename(self, value):
+        value = value.replace('\\', '/').split('/')[-1]
+        try:
+            for validator in Post._meta.get_field('file').validators:
+                validator(File(None, name=value))
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return value
+
+    def validate_length(self, value):
+        max_size = getattr(settings, 'RESUMABLE_UPLOAD_MAX_SIZE', None)
+        if value <= 0:
+            raise serializers.ValidationError('Length must be positive.')
+        if max_size is not None and value > max_size:
+            raise serializers.ValidationError(
+                f'Uploads are limited to {max_size} bytes.')
+        return value
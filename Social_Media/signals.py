@@ -0,0 +1,69 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import search
+from .authentication import user_cache
+from .caching import invalidate_user_posts
+from .models import User, Post
+
+
+# User fields embedded in cached post entries.
+AUTHOR_FIELDS = {'username', 'bio', 'avatar', 'avatar_thumbnail',
+                 'num_followers', 'num_following'}
+
+
+def _touches_index(index, update_fields):
+    if update_fields is None:
+        return True
+    return any(column in update_fields for column, _ in index.columns)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the full-text index in step with created and edited posts.
+    """
+    if search.is_supported() and _touches_index(search.POST_INDEX, update_fields):
+        search.index_instance(search.POST_INDEX, instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    if search.is_supported():
+        search.remove_instance(search.POST_INDEX, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the full-text index in step with created and edited users.
+    """
+    if search.is_supported() and _touches_index(search.USER_INDEX, update_fields):
+        search.index_instance(search.USER_INDEX, instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    if search.is_supported():
+        search.remove_instance(search.USER_INDEX, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_authored_posts(sender, instance, created=False,
+                              update_fields=None, **kwargs):
+    """
+    Invalidate the cached posts of a user whose profile changed.
+    """
+    if created or (update_fields is not None and
+                   not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    invalidate_user_posts(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    """
+    Drop a changed or deleted user from the authentication cache.
+    """
+    user_cache.evict(instance.pk)
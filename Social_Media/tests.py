@@ -1,3 +1,1385 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    activity, graph, likes, media, metrics, notifications, routers,
+    throttling, trending, uploads, websocket)
+from .caching import read_through
+from .activity import process_batch
+from .authentication import get_cached_user, user_cache
+from .models import (
+    User, Post, Comment, Like, SavedPost, TimelineEntry, Activity, Upload)
+
+
+class QueryBudgetMixin:
+    """
+    Assertions on the number of SQL queries an endpoint runs.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, num, using=connection):
+        """
+        Fail if the wrapped block runs more than `num` queries.
+        """
+        with CaptureQueriesContext(using) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > num:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}'
+                for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(f'{executed} queries executed, at most {num} expected:\n'
+                      f'{queries}')
+
+
+def create_user(index, **kwargs):
+    return User.objects.create_user(
+        username=f'user{index}',
+        password='password',
+        phone_number=f'+1202555{index:04d}',
+        **kwargs,
+    )
+
+
+class MigrationTests(TestCase):
+    """
+    Every model change must ship with its migration.
+    """
+
+    def test_no_missing_migrations(self):
+        output = StringIO()
+        try:
+            call_command('makemigrations', 'Social_Media', check=True,
+                         dry_run=True, stdout=output)
+        except SystemExit:
+            self.fail(f'Missing migrations:\n{output.getvalue()}')
+
+
+class EndpointQueryCountTests(QueryBudgetMixin, APITestCase):
+    """
+    Each endpoint must render a page in a constant number of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user(0, is_staff=True)
+        cls.users = [create_user(index) for index in range(1, 11)]
+        cls.post = Post.objects.create(
+            user=cls.admin, title='title', content='content')
+        for user in cls.users:
+            user.following.add(cls.admin)
+            post = Post.objects.create(
+                user=user, title='title', content='content')
+            Comment.objects.create(user=user, post=cls.post, content='content')
+            Like.objects.create(user=user, post=cls.post)
+            SavedPost.objects.create(user=cls.admin, post=post)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_users(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_posts(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_post(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_comments(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/api/posts/{self.post.id}/comments/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_comment(self):
+        comment = Comment.objects.filter(post=self.post).first()
+        with self.assertMaxQueries(1):
+            response = self.client.get(
+                f'/api/posts/{self.post.id}/comments/{comment.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_likes(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(f'/api/posts/{self.post.id}/likes/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_saved_posts(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/api/user/{self.admin.id}/savedPosts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIn('title', response.data['results'][0]['post'])
+
+    def test_retrieve_saved_post(self):
+        saved_post = SavedPost.objects.filter(user=self.admin).first()
+        with self.assertMaxQueries(1):
+            response = self.client.get(
+                f'/api/user/{self.admin.id}/savedPosts/{saved_post.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_retrieve_post(self):
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertMaxQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'title': 'changed'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_author_change_refreshes_cached_post(self):
+        url = f'/api/posts/{self.post.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.data['user'], 'user0')
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.last_login = timezone.now()
+            self.admin.save(update_fields=['last_login'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.username = 'renamed'
+            self.admin.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user'], 'renamed')
+
+    def test_expanded_comments_follow_commenter_changes(self):
+        url = f'/api/posts/{self.post.id}/comments/'
+        commenter = self.users[0]
+        response = self.client.get(url, {'expand': 'user'})
+        self.assertNotIn('ETag', response)
+        self.assertIn('user1', [comment['user']['username']
+                                for comment in response.data['results']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            commenter.username = 'renamed'
+            commenter.save()
+        response = self.client.get(url, {'expand': 'user'},
+                                   HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        usernames = [comment['user']['username']
+                     for comment in response.data['results']]
+        self.assertIn('renamed', usernames)
+        self.assertNotIn('user1', usernames)
+
+    def test_list_posts_sparse_fields(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(
+                '/api/posts/', {'fields': 'id,title,user', 'expand': 'user'})
+        self.assertEqual(response.status_code, 200)
+        post = response.data['results'][0]
+        self.assertEqual(set(post), {'id', 'title', 'user'})
+        self.assertIn('username', post['user'])
+
+    def test_create_like_defers_side_effects(self):
+        post = Post.objects.create(user=self.admin, title='title', content='content')
+        with self.assertMaxQueries(6):
+            response = self.client.post(
+                f'/api/posts/{post.id}/likes/', {'post': post.id})
+        self.assertEqual(response.status_code, 201)
+        post.refresh_from_db()
+        self.assertEqual(post.num_post_likes, 0)
+
+        process_batch()
+        post.refresh_from_db()
+        self.assertEqual(post.num_post_likes, 1)
+
+    def test_export_streams_rows(self):
+        with self.assertMaxQueries(5):
+            response = self.client.get(f'/api/users/{self.admin.id}/export/')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(lines), 1 + 10)
+
+    def test_sparse_retrieve_post_does_not_poison_cache(self):
+        url = f'/api/posts/{self.post.id}/'
+        with self.settings(LIKE_BUFFER_THRESHOLD=0):
+            sparse = self.client.get(url, {'fields': 'id,title'})
+            full = self.client.get(url)
+        self.assertEqual(sparse.status_code, 200)
+        self.assertEqual(set(sparse.data), {'id', 'title'})
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full.data['num_post_likes'], self.post.num_post_likes)
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_BUCKETS={
+    'token_refresh': {'rate': '2/m', 'methods': ['POST']}})
+class ThrottleTests(APITestCase):
+    """
+    Routes with a token bucket answer a 429 once their budget is spent.
+    """
+
+    url = '/api/token/refresh/'
+
+    def setUp(self):
+        throttling._store = None
+
+    def refresh(self, **extra):
+        return self.client.post(self.url, {'refresh': 'invalid'}, **extra)
+
+    def test_budget_exhausted(self):
+        self.assertEqual(self.refresh().status_code, 401)
+        self.assertEqual(self.refresh().status_code, 401)
+        response = self.refresh()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_other_methods_not_throttled(self):
+        for _ in range(3):
+            self.refresh()
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_forwarded_for_ignored_without_proxies(self):
+        for index in range(2):
+            self.refresh(HTTP_X_FORWARDED_FOR=f'10.0.0.{index}')
+        response = self.refresh(HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+
+    def test_forwarded_for_behind_proxy(self):
+        with self.settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)):
+            for index in range(2):
+                self.refresh(HTTP_X_FORWARDED_FOR=f'10.0.0.1, 10.0.0.{index}')
+            response = self.refresh(HTTP_X_FORWARDED_FOR='10.0.0.1, 10.0.0.2')
+        self.assertEqual(response.status_code, 401)
+
+
+class FeedTests(APITestCase):
+    """
+    Home timelines are written on post and follow, and read in one query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(1)
+        cls.reader = create_user(2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def feed_titles(self):
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [post['title'] for post in response.data['results']]
+
+    def create_post(self, title):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(
+            '/api/posts/', {'user': self.author.id, 'title': title, 'content': 'content'})
+        self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(self.reader)
+        process_batch()
+
+    def follow(self, method='put'):
+        getattr(self.client, method)(f'/api/users/{self.author.id}/follow/')
+        process_batch()
+
+    def test_fan_out_on_post(self):
+        self.follow()
+        self.create_post('first')
+        self.create_post('second')
+        self.assertEqual(self.feed_titles(), ['second', 'first'])
+
+    def test_backfill_on_follow(self):
+        self.create_post('first')
+        self.assertEqual(self.feed_titles(), [])
+        self.follow()
+        self.assertEqual(self.feed_titles(), ['first'])
+
+    def test_unfollow_removes_posts(self):
+        self.follow()
+        self.create_post('first')
+        self.follow('delete')
+        self.assertEqual(self.feed_titles(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_follow_and_unfollow_in_one_batch(self):
+        self.create_post('first')
+        self.client.put(f'/api/users/{self.author.id}/follow/')
+        self.client.delete(f'/api/users/{self.author.id}/follow/')
+        self.assertEqual(process_batch(), 2)
+        self.assertEqual(self.feed_titles(), [])
+
+        self.client.put(f'/api/users/{self.author.id}/follow/')
+        self.client.delete(f'/api/users/{self.author.id}/follow/')
+        self.client.put(f'/api/users/{self.author.id}/follow/')
+        process_batch()
+        self.assertEqual(self.feed_titles(), ['first'])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_celebrity_posts_pulled_on_read(self):
+        self.follow()
+        self.author.refresh_from_db()
+        self.create_post('first')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_titles(), ['first'])
+
+
+class ExportTests(APITestCase):
+    """
+    User data exports stream every row of the user in the requested format.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.other = create_user(2)
+        cls.post = Post.objects.create(
+            user=cls.user, title='title', content='content', file='posts/a.txt')
+        Comment.objects.create(user=cls.user, post=cls.post, content='content')
+        Like.objects.create(user=cls.user, post=cls.post)
+        SavedPost.objects.create(user=cls.user, post=cls.post)
+
+    def setUp(self):
+        throttling._store = None
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/users/{self.user.id}/export/'
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'output': 'csv', 'types': 'posts,likes'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(
+            StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['type'] for row in rows], ['posts', 'likes'])
+        self.assertEqual(rows[0]['title'], 'title')
+        self.assertEqual(rows[1]['title'], '')
+
+    def test_gzip(self):
+        response = self.client.get(self.url, {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('export.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).splitlines()
+        self.assertEqual([json.loads(line)['type'] for line in lines],
+                         ['posts', 'comments', 'likes', 'saved_posts'])
+
+    def test_media_zip(self):
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root):
+            default_storage.save('posts/a.txt', ContentFile(b'media'))
+            response = self.client.get(self.url, {'media': '1'})
+            data = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(),
+                             ['export.ndjson', 'media/posts/a.txt'])
+            self.assertEqual(archive.read('media/posts/a.txt'), b'media')
+            self.assertEqual(len(archive.read('export.ndjson').splitlines()), 4)
+
+    def test_invalid_output(self):
+        response = self.client.get(self.url, {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_user_forbidden(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_may_export_other_users(self):
+        self.client.force_authenticate(create_user(3, is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get('/api/users/999/export/').status_code, 404)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        token = await sync_to_async(RefreshToken.for_user)(self.user)
+        response = await self.async_client.get(
+            self.url, headers={'Authorization': f'Bearer {token.access_token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(lines.splitlines()), 4)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Safe requests read from replicas unless their client just wrote.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.router = routers.ReplicaRouter()
+        self.middleware = routers.ReplicaRoutingMiddleware(lambda request: None)
+        self.factory = RequestFactory()
+
+    def route(self, use_replica):
+        token = routers._use_replica.set(use_replica)
+        try:
+            return self.router.db_for_read(Post)
+        finally:
+            routers._use_replica.reset(token)
+
+    def test_reads_follow_the_request(self):
+        self.assertEqual(self.route(True), 'replica')
+        self.assertEqual(self.route(False), 'default')
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.route(True), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_writes_pin_client_to_primary(self):
+        self.assertTrue(self.middleware.use_replica(self.factory.get('/')))
+        self.assertFalse(self.middleware.use_replica(self.factory.post('/')))
+        self.assertFalse(self.middleware.use_replica(self.factory.get('/')))
+        other = self.factory.get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertTrue(self.middleware.use_replica(other))
+
+    def test_pin_keyed_on_token_user(self):
+        token = RefreshToken()
+        token['user_id'] = 1
+        header = {'HTTP_AUTHORIZATION': f'Bearer {token.access_token}'}
+        self.middleware.use_replica(self.factory.post('/', **header))
+        self.assertFalse(self.middleware.use_replica(self.factory.get(
+            '/', REMOTE_ADDR='10.0.0.1', **header)))
+
+    def test_cache_fills_read_from_primary(self):
+        token = routers._use_replica.set(True)
+        try:
+            alias = read_through(
+                1, 'detail', (), lambda: self.router.db_for_read(Post), version=1)
+        finally:
+            routers._use_replica.reset(token)
+        self.assertEqual(alias, 'default')
+
+
+class BulkTests(QueryBudgetMixin, APITestCase):
+    """
+    Batch endpoints apply one action to many ids in a constant number of
+    queries, with the side effects of a single write per created row.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.authors = [create_user(index) for index in range(1, 4)]
+        cls.posts = [Post.objects.create(user=author, title='title', content='content')
+                     for author in cls.authors]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['results']]
+
+    def test_bulk_follow(self):
+        ids = [author.id for author in self.authors]
+        with self.assertMaxQueries(8):
+            response = self.client.post(
+                '/api/users/follow/bulk/', {'ids': [*ids, self.user.id, 999]})
+        self.assertEqual(self.statuses(response),
+                         ['created'] * 3 + ['invalid', 'not_found'])
+        process_batch()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.num_following, 3)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 3)
+
+        response = self.client.post('/api/users/follow/bulk/', {'ids': ids})
+        self.assertEqual(self.statuses(response), ['exists'] * 3)
+        process_batch()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.num_following, 3)
+
+    def test_bulk_like(self):
+        ids = [post.id for post in self.posts]
+        Like.objects.create(user=self.user, post=self.posts[0])
+        with self.assertMaxQueries(8):
+            response = self.client.post('/api/posts/likes/bulk/', {'ids': ids})
+        self.assertEqual(self.statuses(response), ['exists', 'created', 'created'])
+        process_batch()
+        self.assertEqual(
+            list(Post.objects.filter(id__in=ids).order_by('id')
+                 .values_list('num_post_likes', flat=True)), [0, 1, 1])
+
+    def test_follow_row_counted_once(self):
+        self.client.put(f'/api/users/{self.authors[0].id}/follow/')
+        follow = User.following.through.objects.get(from_user=self.user)
+        activity.record_many(activity.FOLLOW_CREATED, [(
+            f'follow:{follow.id}',
+            {'user': self.user.id, 'followed': self.authors[0].id})])
+        process_batch()
+        self.authors[0].refresh_from_db()
+        self.assertEqual(self.authors[0].num_followers, 1)
+
+    def test_bulk_save(self):
+        response = self.client.post(
+            '/api/savedPosts/bulk/', {'ids': [self.posts[0].id, 999]})
+        self.assertEqual(self.statuses(response), ['created', 'not_found'])
+        self.assertTrue(SavedPost.objects.filter(user=self.user).exists())
+
+
+@override_settings(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(APITestCase):
+    """
+    Logins hash in a bounded worker pool and upgrade outdated hashes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1, is_staff=True)
+
+    def setUp(self):
+        throttling._store = None
+
+    def login(self):
+        return self.client.post(
+            '/api/login/', {'username': 'user1', 'password': 'password'})
+
+    def test_hash_upgraded_on_login(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('password'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=0)
+    def test_busy_pool_answers_503(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['detail'].code, 'password_hashing_busy')
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=0)
+    def test_busy_pool_fails_admin_login(self):
+        response = self.client.post('/admin/login/', {
+            'username': 'user1', 'password': 'password', 'next': '/admin/'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+@override_settings(PASSWORD_HASH_WORKERS=0)
+class AsyncViewTests(TestCase):
+    """
+    The async views behave like their synchronous counterparts.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.author = create_user(2)
+        cls.post = Post.objects.create(user=cls.author, title='title', content='content')
+
+    def setUp(self):
+        throttling._store = None
+        cache.clear()
+
+    async def request(self, method, url, data=None, user=None):
+        headers = {}
+        if user is not None:
+            token = await sync_to_async(RefreshToken.for_user)(user)
+            headers['Authorization'] = f'Bearer {token.access_token}'
+        if data is not None:
+            return await getattr(self.async_client, method)(
+                url, json.dumps(data), content_type='application/json',
+                headers=headers)
+        return await getattr(self.async_client, method)(url, headers=headers)
+
+    async def test_list_and_retrieve_posts(self):
+        response = await self.request('get', '/api/async/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.json()['results']],
+                         [self.post.id])
+        response = await self.request('get', f'/api/async/posts/{self.post.id}/')
+        self.assertEqual(response.json()['title'], 'title')
+        response = await self.request('get', '/api/async/posts/999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_invalid_cursor(self):
+        response = await self.request('get', '/api/async/posts/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+    async def test_create_comment(self):
+        url = f'/api/async/posts/{self.post.id}/comments/'
+        response = await self.request('post', url, {'content': 'content'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.request('post', url, {}, user=self.user)
+        self.assertEqual(response.status_code, 400)
+        response = await self.request('post', url, {'content': 'content'}, user=self.user)
+        self.assertEqual(response.status_code, 201)
+        await sync_to_async(process_batch)()
+        await self.post.arefresh_from_db()
+        self.assertEqual(self.post.num_comments, 1)
+
+    async def test_like_twice(self):
+        url = f'/api/async/posts/{self.post.id}/likes/'
+        response = await self.request('post', url, {}, user=self.user)
+        self.assertEqual(response.status_code, 201)
+        response = await self.request('post', url, {}, user=self.user)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_follow_and_unfollow(self):
+        url = f'/api/async/users/{self.author.id}/follow/'
+        response = await self.request('put', url, user=self.user)
+        self.assertEqual(response.status_code, 200)
+        await sync_to_async(process_batch)()
+        await self.author.arefresh_from_db()
+        self.assertEqual(self.author.num_followers, 1)
+        await self.request('delete', url, user=self.user)
+        await sync_to_async(process_batch)()
+        await self.author.arefresh_from_db()
+        self.assertEqual(self.author.num_followers, 0)
+
+    async def test_login(self):
+        response = await self.request(
+            'post', '/api/async/login/', {'username': 'user1', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        response = await self.request(
+            'post', '/api/async/login/', {'username': 'user1', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+
+class PaginationTests(APITestCase):
+    """
+    Keyset pages follow each other without gaps and reject forged cursors.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.posts = [Post.objects.create(user=cls.user, title=str(index), content='content')
+                     for index in range(25)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def test_pages_cover_every_post_once(self):
+        response = self.client.get('/api/posts/', {'page_size': 10})
+        ids = [post['id'] for post in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get('/api/posts/', {'page_size': 0})
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/posts/', {'page_size': 'many'})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_invalid_cursors(self):
+        for cursor in ['garbage', self.cursor([None, None]), self.cursor([1]),
+                       self.cursor({'a': 1, 'b': 2}), self.cursor(['now', 1]),
+                       self.cursor(['2024-01-01T00:00:00', [1]])]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/posts/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class TrendingTests(APITestCase):
+    """
+    Trending posts are ranked by time-decayed likes and comments.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.hot = Post.objects.create(user=cls.user, title='hot', content='content')
+        cls.warm = Post.objects.create(user=cls.user, title='warm', content='content')
+        cls.cold = Post.objects.create(user=cls.user, title='cold', content='content')
+        likers = [create_user(index) for index in range(2, 5)]
+        for liker in likers:
+            Like.objects.create(user=liker, post=cls.hot)
+        Comment.objects.create(user=likers[0], post=cls.warm, content='content')
+        Like.objects.create(
+            user=likers[0], post=cls.cold,
+            created=timezone.now() - timedelta(days=3))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranking(self):
+        trending.compute_trending()
+        response = self.client.get('/api/posts/trending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['title'] for post in response.data], ['hot', 'warm'])
+        self.assertAlmostEqual(response.data[0]['score'], 3.0, delta=0.5)
+
+    def test_decay(self):
+        now = timezone.now()
+        self.assertEqual(trending.decay(0, 6), 1.0)
+        self.assertEqual(trending.decay(6, 6), 0.5)
+        scores = trending.score_posts(now + timedelta(hours=6))
+        self.assertAlmostEqual(scores[self.hot.id], 1.5, delta=0.3)
+
+    def test_miss_serves_stale_ranking(self):
+        trending.compute_trending()
+        cache.delete(trending.TRENDING_KEY)
+        with mock.patch.object(trending, 'schedule_trending') as schedule, \
+                self.assertNumQueries(0):
+            ranking = trending.get_trending()
+        schedule.assert_called_once_with()
+        self.assertEqual([post_id for post_id, _ in ranking],
+                         [self.hot.id, self.warm.id])
+
+    def test_cold_miss_is_empty(self):
+        with mock.patch.object(trending, 'schedule_trending') as schedule:
+            self.assertEqual(trending.get_trending(), [])
+        schedule.assert_called_once_with()
+
+    def test_one_computation_at_a_time(self):
+        cache.set(trending.LOCK_KEY, True)
+        with mock.patch.object(trending.threading, 'Thread') as thread:
+            trending.schedule_trending()
+        thread.assert_not_called()
+
+
+@override_settings(LIKE_BUFFER_THRESHOLD=0)
+class LikeBufferTests(APITestCase):
+    """
+    Likes of hot posts are written behind and inserted in bulk.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.post = Post.objects.create(user=cls.user, title='title', content='content')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.multiple(
+            likes, _store=likes.MemoryLikeStore(), _flusher=mock.Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/posts/{self.post.id}/'
+
+    def like(self):
+        return self.client.post(f'{self.url}likes/', {'post': self.post.id})
+
+    def test_like_buffered(self):
+        self.assertEqual(self.like().status_code, 201)
+        self.assertEqual(self.like().status_code, 400)
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.client.get(self.url).data['num_post_likes'], 1)
+        response = self.client.get(f'{self.url}likes/')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_pending_likes_change_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.like()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['num_post_likes'], 1)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_flush(self):
+        self.like()
+        likes.flush()
+        like = Like.objects.get()
+        self.assertEqual(like.user, self.user)
+        self.assertEqual(likes.get_pending_count(self.post.id), 0)
+        self.assertEqual(process_batch(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.num_post_likes, 1)
+        self.assertEqual(self.client.get(self.url).data['num_post_likes'], 1)
+
+    def test_flush_counts_racing_like_once(self):
+        self.like()
+        bulk_create = Like.objects.bulk_create
+
+        def insert_first(objs, **kwargs):
+            like = Like.objects.create(user=self.user, post=self.post)
+            activity.record(activity.LIKE_CREATED, f'like:{like.id}',
+                            user=self.user.id, post=self.post.id,
+                            author=self.user.id)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Like.objects, 'bulk_create', insert_first):
+            likes.flush()
+        self.assertEqual(Like.objects.count(), 1)
+        process_batch()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.num_post_likes, 1)
+
+    def test_failed_flush_requeues(self):
+        self.like()
+        with mock.patch.object(activity, 'record_many', side_effect=DatabaseError), \
+                self.assertLogs('Social_Media.likes', 'ERROR'):
+            likes.flush()
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(likes.get_pending_count(self.post.id), 1)
+        likes.flush()
+        self.assertTrue(Like.objects.exists())
+
+
+class ActivityTests(TestCase):
+    """
+    The activity log applies each recorded write once, retrying failures
+    with a growing delay.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.author = create_user(2)
+        cls.post = Post.objects.create(user=cls.author, title='title', content='content')
+
+    def setUp(self):
+        patcher = mock.patch.dict(activity.handlers, {'test.fail': self.fail_handler})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def fail_handler(batch, payload):
+        raise ValueError('broken')
+
+    def record_like(self, key='like:1'):
+        activity.record(activity.LIKE_CREATED, key, user=self.user.id,
+                        post=self.post.id, author=self.author.id)
+
+    def test_duplicate_key_applied_once(self):
+        self.record_like()
+        self.record_like()
+        self.assertEqual(Activity.objects.count(), 1)
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(process_batch(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.num_post_likes, 1)
+
+    def test_reconcile_applies_pending_events_first(self):
+        Like.objects.create(user=self.user, post=self.post)
+        self.record_like()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(process_batch(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.num_post_likes, 1)
+
+    def test_failing_event_retried_with_backoff(self):
+        self.record_like()
+        activity.record('test.fail', 'fail:1')
+        with self.settings(ACTIVITY_RETRY_DELAY=10, ACTIVITY_MAX_ATTEMPTS=2), \
+                self.assertLogs('Social_Media.activity', 'ERROR'):
+            self.assertEqual(process_batch(), 2)
+            event = Activity.objects.get(key='fail:1')
+            self.assertIsNone(event.processed)
+            self.assertEqual(event.attempts, 1)
+            self.assertEqual(event.error, 'ValueError: broken')
+            delay = event.available_at - timezone.now()
+            self.assertTrue(timedelta(seconds=9) < delay <= timedelta(seconds=10))
+            self.assertEqual(process_batch(), 0)
+
+            Activity.objects.filter(key='fail:1').update(available_at=timezone.now())
+            self.assertEqual(process_batch(), 1)
+            event.refresh_from_db()
+            self.assertEqual(event.attempts, 2)
+            self.assertGreater(event.available_at - timezone.now(),
+                               timedelta(seconds=19))
+
+            Activity.objects.filter(key='fail:1').update(available_at=timezone.now())
+            self.assertEqual(process_batch(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.num_post_likes, 1)
+
+    def test_external_effects_run_once_after_retry(self):
+        follow = User.following.through.objects.create(
+            from_user=self.user, to_user=self.author)
+        activity.record(activity.FOLLOW_CREATED, f'follow:{follow.id}',
+                        user=self.user.id, followed=self.author.id)
+        activity.record('test.fail', 'fail:1')
+        with mock.patch.object(graph, 'on_follow') as on_follow, \
+                self.assertLogs('Social_Media.activity', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                process_batch()
+        on_follow.assert_called_once_with(self.user.id, self.author.id)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.num_followers, 1)
+
+    def test_prune(self):
+        now = timezone.now()
+        self.record_like('like:1')
+        self.record_like('like:2')
+        self.record_like('like:3')
+        Activity.objects.filter(key='like:1').update(processed=now - timedelta(days=8))
+        Activity.objects.filter(key='like:2').update(processed=now - timedelta(days=1))
+        output = StringIO()
+        call_command('process_activity', prune_only=True, stdout=output)
+        self.assertIn('Pruned 1 events.', output.getvalue())
+        self.assertEqual(set(Activity.objects.values_list('key', flat=True)),
+                         {'like:2', 'like:3'})
+
+
+@override_settings(MEDIA_WORKERS=0)
+class MediaTests(APITestCase):
+    """
+    Uploaded media is processed after the request commits.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(MEDIA_ROOT=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        worker = mock.patch.object(activity, 'get_worker')
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, name, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {
+                'user': self.user.id, 'title': 'title', 'content': 'content',
+                'file': ContentFile(data, name=name)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['media_status'], Post.MEDIA_PENDING)
+        return Post.objects.get(id=response.data['id'])
+
+    def test_image_thumbnail(self):
+        image = BytesIO()
+        Image.new('RGB', (640, 480), 'red').save(image, 'PNG')
+        post = self.create_post('image.png', image.getvalue())
+        self.assertEqual(post.media_status, Post.MEDIA_READY)
+        with Image.open(post.thumbnail) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 240))
+
+    def test_failure_is_recorded(self):
+        with self.assertLogs('Social_Media.media', 'ERROR'):
+            post = self.create_post('broken.png', b'not an image')
+        self.assertEqual(post.media_status, Post.MEDIA_FAILED)
+        self.assertFalse(post.thumbnail)
+
+    def test_inline_job_errors_are_logged(self):
+        job = mock.Mock(side_effect=RuntimeError, __name__='job')
+        with self.assertLogs('Social_Media.media', 'ERROR') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            media.submit(job, 1)
+        job.assert_called_once_with(1)
+        self.assertIn('Media job job(1,) failed', logs.output[0])
+
+    def test_short_video_poster_uses_first_frame(self):
+        calls = []
+
+        def run_ffmpeg(*args):
+            calls.append(args)
+            if '-ss' not in args:
+                with open(args[-1], 'wb') as poster:
+                    poster.write(b'frame')
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(media, 'run_ffmpeg', run_ffmpeg):
+            poster = os.path.join(tmp, 'poster.jpg')
+            media.extract_poster('video.mp4', poster)
+            self.assertTrue(os.path.getsize(poster))
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(MEDIA_WORKERS=0)
+class UploadTests(APITestCase):
+    """
+    Resumable uploads append verified chunks and attach the finished file.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.post = Post.objects.create(user=cls.user, title='title', content='content')
+        image = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(image, 'PNG')
+        cls.data = image.getvalue()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.upload_dir = os.path.join(directory.name, 'uploads')
+        overrides = self.settings(MEDIA_ROOT=os.path.join(directory.name, 'media'),
+                                  RESUMABLE_UPLOAD_DIR=self.upload_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_authenticate(self.user)
+
+    def start(self):
+        response = self.client.post('/api/uploads/', {
+            'post': self.post.id, 'filename': 'image.png', 'length': len(self.data)})
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def send(self, url, offset, data, **headers):
+        return self.client.patch(
+            url, data, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), **headers)
+
+    def checksum(self, data):
+        return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+    def test_upload_in_chunks(self):
+        url = self.start()
+        half = len(self.data) // 2
+        self.assertEqual(self.send(url, 0, self.data[:half]).status_code, 204)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], str(half))
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.send(url, half, self.data[half:],
+                                 HTTP_UPLOAD_CHECKSUM=self.checksum(self.data[half:]))
+        self.assertEqual(response.status_code, 204)
+        upload = Upload.objects.get()
+        self.assertTrue(os.path.exists(uploads.get_partial_path(upload)))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(uploads.get_partial_path(upload)))
+        self.post.refresh_from_db()
+        with self.post.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(self.post.media_status, Post.MEDIA_READY)
+        self.assertTrue(self.post.thumbnail)
+
+    def test_checksum_mismatch(self):
+        url = self.start()
+        response = self.send(url, 0, self.data[:10],
+                             HTTP_UPLOAD_CHECKSUM=self.checksum(b'other'))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '0')
+        self.assertEqual(os.path.getsize(
+            uploads.get_partial_path(Upload.objects.get())), 0)
+
+    def test_offset_conflict(self):
+        url = self.start()
+        response = self.send(url, 5, self.data[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+
+    def test_cleanup(self):
+        self.send(self.start(), 0, self.data[:10])
+        self.send(self.start(), 0, self.data[:10])
+        stale, recent = Upload.objects.order_by('created')
+        past = time.time() - 2 * 24 * 3600
+        Upload.objects.filter(pk=stale.pk).update(
+            created=timezone.now() - timedelta(days=2))
+        os.utime(uploads.get_partial_path(stale), (past, past))
+        orphan = os.path.join(self.upload_dir, f'{uuid.uuid4()}.part')
+        open(orphan, 'wb').close()
+        os.utime(orphan, (past, past))
+
+        output = StringIO()
+        call_command('cleanup_uploads', stdout=output)
+        self.assertIn('Removed 1 abandoned uploads and 1 orphaned', output.getvalue())
+        self.assertEqual(list(Upload.objects.all()), [recent])
+        self.assertEqual(os.listdir(self.upload_dir), [f'{recent.pk}.part'])
+
+
+class SearchTests(APITestCase):
+    """
+    Full-text search ranks posts and, for admins, users by relevance.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user(0, is_staff=True)
+        cls.user = create_user(1, bio='gardening and tomatoes')
+        cls.best = Post.objects.create(
+            user=cls.user, title='tomatoes', content='growing tomatoes')
+        cls.other = Post.objects.create(
+            user=cls.user, title='garden', content='tomatoes in pots')
+        Post.objects.create(user=cls.user, title='bread', content='sourdough')
+
+    def test_posts_ranked_by_relevance(self):
+        response = self.client.get('/api/search/', {'q': 'tomatoes'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [self.best.id, self.other.id])
+
+    def test_pages_follow_the_ranking(self):
+        first = self.client.get('/api/search/', {'q': 'tomatoes', 'page_size': 1})
+        self.assertEqual(first.data['results'][0]['id'], self.best.id)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([post['id'] for post in second.data['results']],
+                         [self.other.id])
+        self.assertIsNone(second.data['next'])
+
+    def test_index_follows_updates(self):
+        self.other.title = 'sourdough'
+        self.other.content = 'bread'
+        self.other.save()
+        response = self.client.get('/api/search/', {'q': 'tomatoes'})
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [self.best.id])
+
+    def test_user_search_requires_admin(self):
+        response = self.client.get('/api/search/', {'q': 'user1', 'type': 'users'})
+        self.assertEqual(response.status_code, 401)
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/search/', {'q': 'user1', 'type': 'users'})
+        self.assertEqual(response.status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/search/', {'q': 'tomatoes', 'type': 'users'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.user.id])
+
+    def test_unknown_type(self):
+        response = self.client.get('/api/search/', {'q': 'x', 'type': 'comments'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FollowGraphTests(APITestCase):
+    """
+    Follow lists, relationships and friend-of-friend suggestions.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(index) for index in range(7)]
+        me, a, b, c, d, e, _ = cls.users
+        for from_user, to_user in [(me, a), (me, b), (a, c), (b, c), (a, d),
+                                   (b, d), (e, d), (c, me)]:
+            graph.Follow.objects.create(from_user=from_user, to_user=to_user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.users[0])
+
+    def ids(self, response):
+        return [user['id'] for user in response.data['results']]
+
+    def test_followers_and_following(self):
+        me, a, b, c, d, e, _ = self.users
+        response = self.client.get(f'/api/users/{d.id}/followers/')
+        self.assertEqual(self.ids(response), [e.id, b.id, a.id])
+        response = self.client.get(f'/api/users/{me.id}/following/',
+                                   {'page_size': 1})
+        self.assertEqual(self.ids(response), [b.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.ids(response), [a.id])
+
+    def test_relationship(self):
+        me, a, _, c, *_ = self.users
+        response = self.client.get(f'/api/users/{a.id}/relationship/')
+        self.assertEqual(response.data, {
+            'following': True, 'followed_by': False, 'mutual': False})
+        response = self.client.get(f'/api/users/{c.id}/relationship/')
+        self.assertEqual(response.data, {
+            'following': False, 'followed_by': True, 'mutual': False})
+
+    def test_suggestions(self):
+        c, d = self.users[3], self.users[4]
+        response = self.client.get('/api/users/suggestions/')
+        self.assertEqual([(user['id'], user['mutuals']) for user in response.data],
+                         [(c.id, 2), (d.id, 2)])
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/users/suggestions/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(SUGGESTIONS_SIZE=1)
+    def test_follow_scores_candidates_missing_from_full_cache(self):
+        me, _, _, c, d, e, _ = self.users
+        self.assertEqual(graph.get_suggestions(me.id), [(c.id, 2)])
+        graph.Follow.objects.create(from_user=me, to_user=e)
+        graph.on_follow(me.id, e.id)
+        self.assertEqual(graph.get_suggestions(me.id), [(d.id, 3)])
+
+    def test_follow_updates_cached_suggestions(self):
+        me, _, _, c, d, e, other = self.users
+        graph.get_suggestions(me.id)
+        graph.Follow.objects.create(from_user=e, to_user=other)
+        graph.Follow.objects.create(from_user=me, to_user=e)
+        graph.on_follow(me.id, e.id)
+        self.assertEqual(graph.get_suggestions(me.id),
+                         [(d.id, 3), (c.id, 2), (other.id, 1)])
+        graph.Follow.objects.filter(from_user=me, to_user=e).delete()
+        graph.on_unfollow(me.id, e.id)
+        self.assertEqual(graph.get_suggestions(me.id), [(c.id, 2), (d.id, 2)])
+
+    @override_settings(SUGGESTIONS_SIZE=1)
+    def test_unfollow_drops_full_cache(self):
+        me, a = self.users[:2]
+        graph.get_suggestions(me.id)
+        graph.on_unfollow(me.id, a.id)
+        self.assertIsNone(cache.get(f'suggestions:{me.id}'))
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    """
+    Authenticated requests load the user row only on a cache miss.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.other = create_user(2)
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = f'/api/users/{self.other.id}/relationship/'
+
+    def test_user_loaded_once(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_changed_user_reloaded(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_cached_user_is_a_copy(self):
+        self.client.get(self.url)
+        get_cached_user(self.user.id).username = 'changed'
+        self.assertEqual(get_cached_user(self.user.id).username, 'user1')
+
+
+class MetricsTests(APITestCase):
+    """
+    Requests are measured per route and exposed at /metrics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        Post.objects.create(user=cls.user, title='title', content='content')
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+    def test_route_counters(self):
+        self.client.get('/api/posts/')
+        self.client.get('/api/posts/')
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('social_media_request_duration_seconds_count'
+                      '{view="posts",method="GET"} 2', text)
+        # The post list runs one query per page.
+        self.assertIn('social_media_request_queries_total'
+                      '{view="posts",method="GET"} 2', text)
+        self.assertIn('le="+Inf"} 2', text)
+
+    def test_unmatched_route(self):
+        self.client.get('/missing/')
+        self.assertIn('view="unmatched",method="GET"', metrics.registry.render())
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_logged_with_sql(self):
+        with self.assertLogs('Social_Media.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/posts/')
+        self.assertIn('Slow request GET /api/posts/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_restricted(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class NotificationTests(TestCase):
+    """
+    Writes are pushed to WebSocket subscribers in rate-limited batches.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.author = create_user(2)
+        cls.post = Post.objects.create(user=cls.author, title='title', content='content')
+
+    def setUp(self):
+        user_cache.clear()
+
+    def test_batch_merges_counters(self):
+        batch = notifications.EventBatch()
+        channel = notifications.post_channel(self.post.id)
+        for _ in range(3):
+            batch.add(channel, notifications.counter(
+                'post', self.post.id, 'num_post_likes', 1))
+        batch.add(channel, {'type': 'comment', 'post': self.post.id})
+        self.assertEqual(batch.drain(), [
+            {'type': 'comment', 'post': self.post.id, 'channel': channel},
+            {'type': 'counter', 'object': 'post', 'id': self.post.id,
+             'field': 'num_post_likes', 'delta': 3},
+        ])
+        self.assertEqual(batch.drain(), [])
+
+    def test_events_published_on_commit(self):
+        with mock.patch.object(notifications, 'get_bus') as get_bus:
+            with self.captureOnCommitCallbacks() as callbacks:
+                notifications.notify_like(self.user.id, self.post.id, self.author.id)
+            get_bus.return_value.publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(get_bus.return_value.publish.call_args_list, [
+            mock.call(f'post:{self.post.id}', notifications.counter(
+                'post', self.post.id, 'num_post_likes', 1)),
+            mock.call(f'user:{self.author.id}', {
+                'type': 'like', 'post': self.post.id, 'user': self.user.id}),
+        ])
+
+    async def connect(self, path, user):
+        token = await sync_to_async(RefreshToken.for_user)(user)
+        scope = {'type': 'websocket', 'path': path,
+                 'query_string': f'token={token.access_token}'.encode(),
+                 'headers': []}
+        received, sent = asyncio.Queue(), asyncio.Queue()
+        await received.put({'type': 'websocket.connect'})
+        task = asyncio.create_task(websocket.websocket_application(
+            scope, received.get, sent.put))
+        return task, received, sent
+
+    async def test_stream_post_events(self):
+        task, received, sent = await self.connect(
+            f'/ws/posts/{self.post.id}/', self.user)
+        self.assertEqual(await sent.get(), {'type': 'websocket.accept'})
+        notifications.get_bus().publish(
+            notifications.post_channel(self.post.id),
+            notifications.counter('post', self.post.id, 'num_comments', 1))
+        message = await asyncio.wait_for(sent.get(), timeout=5)
+        self.assertEqual(json.loads(message['text'])['events'], [
+            {'type': 'counter', 'object': 'post', 'id': self.post.id,
+             'field': 'num_comments', 'delta': 1}])
+        await received.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, timeout=5)
+
+    async def test_user_channel_is_private(self):
+        task, _, sent = await self.connect(
+            f'/ws/users/{self.author.id}/', self.user)
+        await asyncio.wait_for(task, timeout=5)
+        self.assertEqual(await sent.get(), {
+            'type': 'websocket.close', 'code': websocket.CLOSE_FORBIDDEN})
@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Atomically refill a bucket for the time elapsed since its last use and
+# take one token. Returns {allowed, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate):
+    """
+    Turn a 'number/period' rate such as '10/m' into tokens per second.
+    """
+    number, period = rate.split('/')
+    return int(number) / PERIODS[period[0]]
+
+
+class Bucket:
+    """
+    The budget of one route: `burst` tokens refilled at `rate` per second.
+    """
+
+    def __init__(self, name, rate, burst=None, methods=None):
+        self.name = name
+        self.rate = parse_rate(rate)
+        self.capacity = burst or int(rate.split('/')[0])
+        self.methods = {method.upper() for method in methods} if methods else None
+
+    def applies_to(self, method):
+        return self.methods is None or method in self.methods
+
+
+class LocalBucketStore:
+    """
+    Token buckets kept in this process, for development and tests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, rate, capacity):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return True, 0.0
+            self.buckets[key] = (tokens, now)
+            return False, (1 - tokens) / rate
+
+
+class RedisBucketStore:
+    """
+    Token buckets kept in the Redis cache and updated by a Lua script, so
+    every process shares one budget and concurrent requests cannot both
+    take the last token.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.script = cache._cache.get_client(write=True).register_script(
+            TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, rate, capacity):
+        allowed, wait = self.script(
+            keys=[self.cache.make_key(key)], args=[rate, capacity])
+        return bool(allowed), float(wait)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the bucket store for THROTTLE_CACHE_ALIAS.
+
+    Redis caches share the buckets across processes; any other backend
+    falls back to per-process buckets.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+            if isinstance(cache, RedisCache):
+                _store = RedisBucketStore(cache)
+            else:
+                _store = LocalBucketStore()
+        return _store
+
+
+def get_buckets():
+    """
+    Return the Bucket of each URL name listed in THROTTLE_BUCKETS.
+    """
+    return {name: Bucket(name, **options)
+            for name, options in getattr(settings, 'THROTTLE_BUCKETS', {}).items()}
+
+
+def get_ident(request):
+    """
+    Identify the client of a request: its user id when it carries a valid
+    access token, its address otherwise.
+
+    The token signature is checked, which needs no database query, so a
+    forged token cannot be used to dodge the per-address budget. The address
+    only trusts as many X-Forwarded-For entries as REST_FRAMEWORK['NUM_PROXIES']
+    proxies, so a client cannot pick its own.
+    """
+    header = request.META.get(api_settings.AUTH_HEADER_NAME, '').split()
+    if len(header) == 2 and header[0] in api_settings.AUTH_HEADER_TYPES:
+        try:
+            token = AccessToken(header[1])
+            return f'user:{token[api_settings.USER_ID_CLAIM]}'
+        except (TokenError, KeyError):
+            pass
+    return 'ip:' + BaseThrottle().get_ident(request)
+
+
+class ThrottleMiddleware:
+    """
+    Reject requests over their route's token-bucket budget with a 429.
+
+    Runs once the URL is resolved but before the view, so throttled
+    requests cost no authentication, database query or password hashing.
+    Budgets are set per URL name in THROTTLE_BUCKETS; routes without one are
+    not throttled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return None
+        match = request.resolver_match
+        bucket = get_buckets().get(match.url_name) if match else None
+        if bucket is None or not bucket.applies_to(request.method):
+            return None
+        allowed, wait = get_store().take(
+            f'throttle:{bucket.name}:{get_ident(request)}',
+            bucket.rate, bucket.capacity)
+        if allowed:
+            return None
+        wait = max(1, math.ceil(wait))
+        return JsonResponse(
+            {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+            status=429, headers={'Retry-After': str(wait)})
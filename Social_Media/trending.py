@@ -0,0 +1,129 @@
+import heapq
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .caching import get_cache
+from .models import Comment, Like
+
+logger = logging.getLogger(__name__)
+
+TRENDING_KEY = 'trending:posts'
+# The last ranking, kept without expiry and served while a new one is
+# computed, and the flag of a computation in progress.
+STALE_KEY = 'trending:posts:stale'
+LOCK_KEY = 'trending:computing'
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def decay(age_hours, half_life_hours):
+    """
+    Return the weight of an event that happened `age_hours` ago.
+    """
+    return math.pow(0.5, max(age_hours, 0.0) / half_life_hours)
+
+
+def activity_buckets(model, field, since):
+    """
+    Count the rows of `model` created since `since`, per post and hour.
+
+    Grouping in the database keeps the scoring job proportional to the
+    number of (post, hour) pairs rather than the number of likes.
+    """
+    return (model.objects.filter(**{field + '__gte': since})
+            .annotate(hour=TruncHour(field))
+            .values_list('post_id', 'hour')
+            .annotate(total=Count('id'))
+            .order_by()
+            .iterator(chunk_size=5000))
+
+
+def score_posts(now=None):
+    """
+    Compute the hotness of every post with recent likes or comments.
+
+    Each like and comment adds its weight, halved for every
+    TRENDING_HALF_LIFE_HOURS since its hour started. Only activity in the
+    last TRENDING_WINDOW_HOURS counts.
+
+    Returns a dict mapping post ids to scores.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(hours=get_setting('TRENDING_WINDOW_HOURS', 48))
+    half_life = get_setting('TRENDING_HALF_LIFE_HOURS', 6)
+    weights = [
+        (Like, 'created', get_setting('TRENDING_LIKE_WEIGHT', 1.0)),
+        (Comment, 'created_at', get_setting('TRENDING_COMMENT_WEIGHT', 2.0)),
+    ]
+    scores = defaultdict(float)
+    for model, field, weight in weights:
+        for post_id, hour, total in activity_buckets(model, field, since):
+            age_hours = (now - hour).total_seconds() / 3600
+            scores[post_id] += weight * total * decay(age_hours, half_life)
+    return scores
+
+
+def compute_trending(now=None):
+    """
+    Score recent activity and cache the top TRENDING_SIZE posts.
+
+    Returns the cached list of (post id, score) pairs, best first.
+    """
+    scores = score_posts(now)
+    top = heapq.nlargest(get_setting('TRENDING_SIZE', 100), scores.items(),
+                         key=lambda item: (item[1], item[0]))
+    cache = get_cache()
+    cache.set(TRENDING_KEY, top,
+              timeout=get_setting('TRENDING_CACHE_TIMEOUT', 3600))
+    cache.set(STALE_KEY, top, timeout=None)
+    return top
+
+
+def schedule_trending():
+    """
+    Compute the ranking in a background thread, unless a computation is
+    already running in any process sharing the cache.
+    """
+    if not get_cache().add(LOCK_KEY, True,
+                           timeout=get_setting('TRENDING_LOCK_TIMEOUT', 300)):
+        return
+
+    def run():
+        close_old_connections()
+        try:
+            compute_trending()
+        except Exception:
+            logger.exception('Could not compute trending posts')
+        finally:
+            get_cache().delete(LOCK_KEY)
+            close_old_connections()
+
+    threading.Thread(target=run, name='trending', daemon=True).start()
+
+
+def get_trending(limit=20):
+    """
+    Return up to `limit` (post id, score) pairs from the cached ranking.
+
+    The ranking is kept fresh by running the compute_trending command
+    periodically. When it expired anyway, the previous ranking (or an empty
+    one) is returned and a new one is computed in the background, so no
+    request waits for the scoring job.
+    """
+    values = get_cache().get_many([TRENDING_KEY, STALE_KEY])
+    top = values.get(TRENDING_KEY)
+    if top is None:
+        schedule_trending()
+        top = values.get(STALE_KEY, [])
+    return top[:limit]
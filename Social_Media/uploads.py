@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Post, Upload
+
+CHUNK_READ_SIZE = 64 * 1024
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def get_upload_dir():
+    """
+    Return the directory holding partially uploaded files.
+    """
+    return str(getattr(settings, 'RESUMABLE_UPLOAD_DIR',
+                       settings.BASE_DIR / 'uploads'))
+
+
+def get_expiry():
+    """
+    Return how long an upload may go without a chunk before it is cleaned up.
+    """
+    return timedelta(hours=getattr(settings, 'RESUMABLE_UPLOAD_EXPIRY_HOURS', 24))
+
+
+def get_partial_path(upload):
+    return os.path.join(get_upload_dir(), f'{upload.id}.part')
+
+
+def parse_checksum(header):
+    """
+    Parse an `Upload-Checksum: <algorithm> <base64 digest>` header.
+
+    Returns an (algorithm, digest) pair, or None when the header is absent.
+    """
+    if not header:
+        return None
+    try:
+        algorithm, encoded = header.split(' ', 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise ChecksumMismatch('Malformed Upload-Checksum header.')
+    if algorithm.lower() not in hashlib.algorithms_available:
+        raise ChecksumMismatch(f'Unsupported checksum algorithm {algorithm}.')
+    return algorithm.lower(), digest
+
+
+def append_chunk(upload, stream, size, checksum=None):
+    """
+    Append `size` bytes read from `stream` to the partial file of an upload.
+
+    The chunk is streamed straight to disk in small reads, so memory stays
+    flat however large it is. If the checksum does not match, the partial
+    file is truncated back to where the chunk started.
+
+    Returns the new offset.
+    """
+    path = get_partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hasher = hashlib.new(checksum[0]) if checksum else None
+    written = 0
+    with open(path, 'ab') as partial:
+        partial.truncate(upload.offset)
+        while written < size:
+            data = stream.read(min(CHUNK_READ_SIZE, size - written))
+            if not data:
+                break
+            partial.write(data)
+            if hasher is not None:
+                hasher.update(data)
+            written += len(data)
+        if hasher is not None and hasher.digest() != checksum[1]:
+            partial.truncate(upload.offset)
+            raise ChecksumMismatch('Upload-Checksum does not match the chunk.')
+    return upload.offset + written
+
+
+def assemble(upload):
+    """
+    Attach a finished upload to its post and mark it completed.
+
+    Call it inside the transaction saving both. The file is moved into
+    storage once the transaction commits, so a rollback leaves the partial
+    file in place for the client to resume.
+    """
+    post = upload.post
+    path = get_partial_path(upload)
+    storage = post.file.storage
+    name = storage.get_available_name(
+        post.file.field.generate_filename(post, upload.filename))
+    post.file.name = name
+    upload.completed = timezone.now()
+    transaction.on_commit(lambda: store(post.pk, storage, path, name))
+    return post
+
+
+def store(post_id, storage, path, name):
+    """
+    Move a finished partial file into storage under `name`.
+
+    On the local filesystem the partial file is renamed into place, so the
+    data is never copied; other storages receive it as a chunked stream.
+    """
+    if isinstance(storage, FileSystemStorage):
+        target = storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return
+    with open(path, 'rb') as partial:
+        stored = storage.save(name, File(partial))
+    os.remove(path)
+    if stored != name:
+        Post.objects.filter(pk=post_id).update(file=stored)
+
+
+def discard(upload):
+    """
+    Remove the partial file of an abandoned upload.
+    """
+    try:
+        os.remove(get_partial_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def cleanup(max_age):
+    """
+    Delete the uploads not completed nor resumed within `max_age`, and the
+    partial files no upload refers to any more.
+
+    Returns the number of uploads and orphaned files removed.
+    """
+    cutoff = timezone.now() - max_age
+    removed = 0
+    for upload in Upload.objects.filter(completed__isnull=True, created__lt=cutoff):
+        try:
+            modified = os.path.getmtime(get_partial_path(upload))
+        except FileNotFoundError:
+            modified = None
+        if modified is None or modified < cutoff.timestamp():
+            discard(upload)
+            upload.delete()
+            removed += 1
+
+    orphans = 0
+    directory = get_upload_dir()
+    if os.path.isdir(directory):
+        known = {str(pk) for pk in Upload.objects.filter(
+            completed__isnull=True).values_list('pk', flat=True)}
+        for entry in os.scandir(directory):
+            upload_id, extension = os.path.splitext(entry.name)
+            if extension == '.part' and upload_id not in known and \
+                    entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+                orphans += 1
+    return removed, orphans
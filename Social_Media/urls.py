@@ -7,15 +7,35 @@ from .views import (
     ListCreateSavedPostView,
     RetrieveUpdateDestroySavedPostView,
     RegisterUser,
+    LogoutView,
     ListUserView,
     ListCreateLikeView,
-    FollowView
-
+    FollowView,
+    FeedView,
+    BulkFollowView,
+    BulkLikeView,
+    BulkSavedPostView,
+    CreateUploadView,
+    UploadView,
+    SearchView,
+    FollowersView,
+    FollowingView,
+    RelationshipView,
+    SuggestionsView,
+    TrendingPostsView,
+    ExportView
+)
+from .async_views import (
+    AsyncListPostView,
+    AsyncRetrievePostView,
+    AsyncListCreateCommentView,
+    AsyncCreateLikeView,
+    AsyncFollowView,
+    AsyncLoginView
 )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
-    TokenRefreshView,
-    TokenBlacklistView
+    TokenRefreshView
 )
 
 urlpatterns = [
@@ -23,11 +43,17 @@ urlpatterns = [
     path('register/', RegisterUser.as_view(), name='register'),
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('logout/', TokenBlacklistView.as_view(),
+    path('logout/', LogoutView.as_view(),
          name='token_blacklist'),
+    path('feed/', FeedView.as_view(), name='feed'),
+    path('search/', SearchView.as_view(), name='search'),
     path('posts/', ListCreatePostView.as_view(), name='posts'),
+    path('posts/trending/', TrendingPostsView.as_view(),
+         name='trending-posts'),
     path('posts/<int:pk>/', RetrieveUpdateDestroyPostView.as_view(),
          name='post-details'),
+    path('uploads/', CreateUploadView.as_view(), name='uploads'),
+    path('uploads/<uuid:pk>/', UploadView.as_view(), name='upload-details'),
     path('posts/<int:post_id>/likes/',
          ListCreateLikeView.as_view(), name='add-like'),
     path('posts/<int:post_id>/comments/',
@@ -39,4 +65,26 @@ urlpatterns = [
     path('user/<int:user_id>/savedPosts/<int:pk>/',
          RetrieveUpdateDestroySavedPostView.as_view(), name='savedPost-details'),
     path('users/<int:pk>/follow/', FollowView.as_view(), name='follow'),
+    path('users/<int:pk>/followers/', FollowersView.as_view(),
+         name='followers'),
+    path('users/<int:pk>/following/', FollowingView.as_view(),
+         name='following'),
+    path('users/<int:pk>/export/', ExportView.as_view(), name='export'),
+    path('users/<int:pk>/relationship/', RelationshipView.as_view(),
+         name='relationship'),
+    path('users/suggestions/', SuggestionsView.as_view(), name='suggestions'),
+    path('users/follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('posts/likes/bulk/', BulkLikeView.as_view(), name='bulk-like'),
+    path('savedPosts/bulk/', BulkSavedPostView.as_view(),
+         name='bulk-savedPosts'),
+    path('async/posts/', AsyncListPostView.as_view(), name='async-posts'),
+    path('async/posts/<int:pk>/', AsyncRetrievePostView.as_view(),
+         name='async-post-details'),
+    path('async/posts/<int:post_id>/comments/',
+         AsyncListCreateCommentView.as_view(), name='async-comments'),
+    path('async/posts/<int:post_id>/likes/',
+         AsyncCreateLikeView.as_view(), name='async-add-like'),
+    path('async/users/<int:pk>/follow/', AsyncFollowView.as_view(),
+         name='async-follow'),
+    path('async/login/', AsyncLoginView.as_view(), name='async-login'),
 ]
@@ -1,6 +1,14 @@
-from django.http import Http404
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import render
-from .models import User, Post, Comment, Like, SavedPost
+from .models import User, Post, Comment, Like, SavedPost, Upload
 from .serializers import (
     PostSerializer,
     PostRetrieveUpdateDestroySerializer,
@@ -10,19 +18,98 @@ from .serializers import (
     SavedPostRetrieveDestroySerializer,
     UserSerializer,
     LikePostSerializer,
-    FollowSerializer
+    FollowSerializer,
+    BulkIdsSerializer,
+    UploadSerializer,
+    UserSummarySerializer,
+    parse_field_list
 )
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.contrib.auth.hashers import make_password
 from rest_framework.permissions import (
     AllowAny,
     IsAdminUser,
     IsAuthenticated,
-    IsAuthenticatedOrReadOnly
+    IsAuthenticatedOrReadOnly,
+    SAFE_METHODS
 )
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenBlacklistView
 from .permissions import PostUserEditPermission, CommentUserEditPermission
+from .authentication import user_cache
+from .prefetch import PrefetchRelatedMixin
+from .pagination import PostPagination, CommentPagination, SearchPagination
+from .search import search
+from .trending import get_trending
+from .bulk import bulk_follow, bulk_like, bulk_save, get_max_items
+from .caching import read_through, invalidate_post, get_post_state, post_etag
+from .uploads import (
+    ChecksumMismatch,
+    parse_checksum,
+    append_chunk,
+    assemble,
+    discard
+)
+from .media import schedule_post_media, schedule_avatar
+from .hashing import hash_password
+from .likes import (
+    get_buffer_threshold,
+    should_buffer,
+    buffer_like,
+    get_pending_like,
+    get_pending_count
+)
+from .feed import get_feed
+from .notifications import notify_like
+from . import activity, export, graph
+
+
+def query_key(request):
+    """
+    Build a stable cache key part from the query string of a request.
+    """
+    return urlencode(sorted(request.query_params.lists()), doseq=True)
+
+
+def conditional_read(request, post_id, name, parts, compute, pending=()):
+    """
+    Serve a cached entry of a post with ETag and Last-Modified validators.
+
+    The validators only depend on the post version, so a matching
+    If-None-Match or If-Modified-Since is answered with a 304 before the
+    entry is read, let alone queried and serialized.
+
+    `pending` lists changes the caller adds to the cached entry, such as
+    buffered likes. They are part of the ETag, and Last-Modified is left
+    out while there are any, since they do not bump the post version.
+
+    Requests with `expand` embed other users, whose changes do not bump the
+    post version either, so they are computed afresh without validators.
+    """
+    if parse_field_list(request, 'expand'):
+        return Response(compute())
+    version, modified = get_post_state(post_id)
+    etag = post_etag(post_id, version, name, *parts, *pending)
+    last_modified = None
+    if modified is not None and not pending:
+        last_modified = int(modified)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        if last_modified is not None:
+            not_modified['Last-Modified'] = http_date(last_modified)
+        return not_modified
+
+    response = Response(read_through(post_id, name, parts, compute,
+                                     version=version))
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
 
 
 class RegisterUser(generics.CreateAPIView):
@@ -35,15 +122,41 @@ class RegisterUser(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         data = request.data.copy()
         if 'password' in data:
-            data['password'] = make_password(data['password'])
+            data['password'] = hash_password(data['password'])
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def perform_create(self, serializer):
+        """
+        Save the user and queue the avatar thumbnail in the background.
+        """
+        user = serializer.save()
+        schedule_avatar(user)
+
+
+class LogoutView(TokenBlacklistView):
+    """
+    API view for logging out by blacklisting a refresh token.
+
+    The user is also dropped from the authentication cache.
+    """
 
-class ListUserView(generics.ListAPIView):
+    def post(self, request, *args, **kwargs):
+        try:
+            user_id = RefreshToken(request.data.get('refresh')).get(
+                jwt_settings.USER_ID_CLAIM)
+        except TokenError:
+            user_id = None
+        response = super().post(request, *args, **kwargs)
+        if user_id is not None and response.status_code == status.HTTP_200_OK:
+            user_cache.evict(user_id)
+        return response
+
+
+class ListUserView(PrefetchRelatedMixin, generics.ListAPIView):
     """
     A view for listing users.
     """
@@ -57,12 +170,13 @@ class ListUserView(generics.ListAPIView):
         return User.objects.all()
 
 
-class ListCreatePostView(generics.ListCreateAPIView):
+class ListCreatePostView(PrefetchRelatedMixin, generics.ListCreateAPIView):
     """
     A view for listing and creating posts.
     """
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = PostPagination
 
     def get_queryset(self):
         """
@@ -70,8 +184,39 @@ class ListCreatePostView(generics.ListCreateAPIView):
         """
         return Post.objects.all()
 
+    def perform_create(self, serializer):
+        """
+        Save the post, queue its fan-out to the timelines of the author's
+        followers and queue its media for processing in the background.
+        """
+        has_file = bool(serializer.validated_data.get('file'))
+        with transaction.atomic():
+            post = serializer.save(
+                media_status=Post.MEDIA_PENDING if has_file else Post.MEDIA_NONE)
+            activity.record(activity.POST_CREATED, f'post:{post.id}', post=post.id)
+        schedule_post_media(post)
+
 
-class RetrieveUpdateDestroyPostView(generics.RetrieveUpdateDestroyAPIView):
+class FeedView(generics.ListAPIView):
+    """
+    A view for reading the home timeline of the authenticated user.
+
+    The timeline holds the user's own posts and the posts of the users they
+    follow, newest first.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PostPagination
+
+    def list(self, request, *args, **kwargs):
+        posts = self.paginator.paginate_results(
+            lambda limit, before: get_feed(request.user, limit, before),
+            Post, request)
+        serializer = self.get_serializer(posts, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class RetrieveUpdateDestroyPostView(PrefetchRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     A view for retrieving, updating and deleting a specific post instance
     based on the post id.
@@ -84,10 +229,47 @@ class RetrieveUpdateDestroyPostView(generics.RetrieveUpdateDestroyAPIView):
         Retrieve and return a specific Post instance based on the pk parameter.
         """
         post_id = self.kwargs.get('pk', None)
-        return Post.objects.get(id=post_id)
+        return self.optimize_queryset(Post.objects.all()).get(id=post_id)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the post from the cache, loading it from the database on a miss.
 
-class ListCreateCommentView(generics.ListCreateAPIView):
+        Conditional requests for an unchanged post get a 304. Likes still
+        waiting in the write-behind buffer are added to the like count.
+        The entry is keyed on the query string, since `fields` and `expand`
+        change the representation.
+        """
+        post_id = self.kwargs.get('pk')
+        pending = get_pending_count(post_id) \
+            if get_buffer_threshold() is not None else 0
+        response = conditional_read(
+            request, post_id, 'detail', (query_key(request),),
+            lambda: self.get_serializer(self.get_object()).data,
+            pending=(f'likes+{pending}',) if pending else ())
+        if response.status_code == status.HTTP_200_OK and pending and \
+                'num_post_likes' in response.data:
+            response.data = dict(
+                response.data,
+                num_post_likes=response.data['num_post_likes'] + pending)
+        return response
+
+    def perform_update(self, serializer):
+        if 'file' in serializer.validated_data:
+            has_file = bool(serializer.validated_data['file'])
+            post = serializer.save(
+                media_status=Post.MEDIA_PENDING if has_file else Post.MEDIA_NONE)
+            schedule_post_media(post)
+        else:
+            post = serializer.save()
+        invalidate_post(post.id)
+
+    def perform_destroy(self, instance):
+        invalidate_post(instance.id)
+        super().perform_destroy(instance)
+
+
+class ListCreateCommentView(PrefetchRelatedMixin, generics.ListCreateAPIView):
     """
     A view for listing and creating comments.
 
@@ -96,6 +278,7 @@ class ListCreateCommentView(generics.ListCreateAPIView):
     """
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CommentPagination
 
     def get_queryset(self):
         """
@@ -104,28 +287,37 @@ class ListCreateCommentView(generics.ListCreateAPIView):
         post_id = self.kwargs.get('post_id', None)
         return Comment.objects.filter(post=post_id)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the requested page of comments from the cache when possible,
+        or a 304 when the client's copy is still current.
+        """
+        return conditional_read(
+            request, self.kwargs.get('post_id'), 'comments', (query_key(request),),
+            lambda: super(ListCreateCommentView, self).list(
+                request, *args, **kwargs).data)
+
     def perform_create(self, serializer):
         """
         Perform the creation of a comment associated with a specific post.
 
+        The comment is authored by the authenticated user.
+
         Parameters:
         - serializer: The serializer object to process the data for creating the comment.
         """
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
-        user = self.request.data['user']
-        user = User.objects.get(id=user)
-        post.num_comments += 1
-        comment = Comment.objects.create(
-            user=user,
-            post=post,
-            content=self.request.data['content']
-        )
-        post.save()
-        comment.save()
+        with transaction.atomic():
+            comment = serializer.save(user=self.request.user, post=post)
+            activity.record(
+                activity.COMMENT_CREATED, f'comment:{comment.id}',
+                comment=comment.id, user=comment.user_id, post=post.id,
+                author=post.user_id)
+        invalidate_post(post.id)
 
 
-class RetrieveUpdateDestroyCommentView(generics.RetrieveUpdateDestroyAPIView):
+class RetrieveUpdateDestroyCommentView(PrefetchRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     A view for retrieving, updating and deleting a specific Comment instance
     based on the comment id.
@@ -142,22 +334,17 @@ class RetrieveUpdateDestroyCommentView(generics.RetrieveUpdateDestroyAPIView):
         """
         post_id = self.kwargs.get('post_id', None)
         comment_id = self.kwargs.get('pk', None)
-        return Comment.objects.get(id=comment_id, post_id=post_id)
+        return self.optimize_queryset(Comment.objects.all()).get(
+            id=comment_id, post=post_id)
 
-    def get_object(self):
-        """
-        Retrieve a comment object from the database based on the provided post_id and comment_id.
-
-        Returns:
-            Comment: The retrieved Comment object.
-        """
-        post_id = self.kwargs.get('post_id', None)
-        comment_id = self.kwargs.get('pk', None)
-        return Comment.objects.get(id=comment_id, post=post_id)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_post(serializer.instance.post_id)
 
     def destroy(self, request, *args, **kwargs):
         """
-        Override the destroy method to decrement the number of comments for the post.
+        Override the destroy method to queue the decrement of the number of
+        comments for the post.
         """
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
@@ -166,15 +353,25 @@ class RetrieveUpdateDestroyCommentView(generics.RetrieveUpdateDestroyAPIView):
         if comment.post != post:
             raise ValidationError(
                 'This comment does not belong to the specified post.')
-        post.num_comments -= 1
-        post.save()
-        comment.delete()
+        with transaction.atomic():
+            activity.record(activity.COMMENT_DELETED,
+                            f'comment:{comment.id}:deleted', post=post.id)
+            comment.delete()
+        invalidate_post(post.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ListCreateSavedPostView(generics.ListCreateAPIView):
+class ListCreateSavedPostView(PrefetchRelatedMixin, generics.ListCreateAPIView):
     serializer_class = SavedPostSerializer
 
+    def get_serializer_class(self):
+        """
+        Embed the saved post and its author when listing.
+        """
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            return SavedPostRetrieveDestroySerializer
+        return SavedPostSerializer
+
     def get_queryset(self):
         """
         Retrieve a queryset of SavedPost objects filtered by the user_id parameter.
@@ -182,8 +379,15 @@ class ListCreateSavedPostView(generics.ListCreateAPIView):
         user_id = self.kwargs.get('user_id', None)
         return SavedPost.objects.filter(user=user_id)
 
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError('You have already saved this post')
+
 
-class RetrieveUpdateDestroySavedPostView(generics.RetrieveDestroyAPIView):
+class RetrieveUpdateDestroySavedPostView(PrefetchRelatedMixin, generics.RetrieveDestroyAPIView):
     serializer_class = SavedPostRetrieveDestroySerializer
 
     def get_object(self):
@@ -192,11 +396,13 @@ class RetrieveUpdateDestroySavedPostView(generics.RetrieveDestroyAPIView):
         """
         user_id = self.kwargs.get('user_id')
         post_id = self.kwargs.get('pk')
-        return SavedPost.objects.get(id=post_id, user=user_id)
+        return self.optimize_queryset(SavedPost.objects.all()).get(
+            id=post_id, user=user_id)
 
 
-class ListCreateLikeView(generics.ListCreateAPIView):
+class ListCreateLikeView(PrefetchRelatedMixin, generics.ListCreateAPIView):
     serializer_class = LikePostSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         """
@@ -207,27 +413,64 @@ class ListCreateLikeView(generics.ListCreateAPIView):
         like_queryset = Like.objects.filter(post=post)
         return like_queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the requested page of likes from the cache when possible,
+        or a 304 when the client's copy is still current.
+
+        A like of the requesting user still waiting in the write-behind
+        buffer is put at the top of the first page.
+        """
+        post_id = self.kwargs.get('post_id')
+        like = None
+        if get_buffer_threshold() is not None and \
+                request.user.is_authenticated and \
+                self.paginator.cursor_query_param not in request.query_params:
+            like = get_pending_like(post_id, request.user.id)
+        response = conditional_read(
+            request, post_id, 'likes', (query_key(request),),
+            lambda: super(ListCreateLikeView, self).list(
+                request, *args, **kwargs).data,
+            pending=(f'like:{request.user.id}',) if like is not None else ())
+        if response.status_code == status.HTTP_200_OK and like is not None:
+            response.data = dict(
+                response.data,
+                results=[self.get_serializer(like).data,
+                         *response.data['results']])
+        return response
+
     def perform_create(self, serializer):
         """
         Perform the create action for the Like model.
 
-        Checks if the user has already liked the post, if so raises a validation
-        error, else creates a new Like instance and updates the number of likes
-        for the post.
+        Creates a new Like instance for the authenticated user and updates the
+        number of likes for the post. A second like by the same user is
+        rejected by the unique constraint on (user, post) and raises a
+        validation error.
+
+        Likes of posts past LIKE_BUFFER_THRESHOLD are written behind: they
+        are recorded in the like buffer and inserted by the next flush, and
+        the response carries the like without an id.
         """
 
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
-        user = self.request.data['user']
-        user = User.objects.get(id=user)
-        like_queryset = Like.objects.filter(user=user, post=post)
-        if like_queryset.exists():
+        if should_buffer(post):
+            if not buffer_like(self.request.user, post):
+                raise ValidationError('You have already liked this post')
+            serializer.instance = Like(
+                user=self.request.user, post=post, created=timezone.now())
+            notify_like(self.request.user.id, post.id, post.user_id)
+            return
+        try:
+            with transaction.atomic():
+                like = serializer.save(user=self.request.user, post=post)
+                activity.record(
+                    activity.LIKE_CREATED, f'like:{like.id}',
+                    user=self.request.user.id, post=post.id, author=post.user_id)
+        except IntegrityError:
             raise ValidationError('You have already liked this post')
-        else:
-            post.num_post_likes += 1
-            like = Like.objects.create(user=user, post=post)
-            post.save()
-            like.save()
+        invalidate_post(post.id)
 
 
 class FollowView(generics.UpdateAPIView):
@@ -244,20 +487,364 @@ class FollowView(generics.UpdateAPIView):
         user_to_follow = User.objects.get(pk=kwargs['pk'])
         user = request.user
         if user_to_follow != user:
-            user.following.add(user_to_follow)
-            user.num_following += 1
-            user_to_follow.num_followers += 1
-            user.save()
-            user_to_follow.save()
+            with transaction.atomic():
+                follow, created = User.following.through.objects.get_or_create(
+                    from_user=user, to_user=user_to_follow)
+                if created:
+                    activity.record(
+                        activity.FOLLOW_CREATED, f'follow:{follow.id}',
+                        user=user.id, followed=user_to_follow.id)
             return Response({'message': 'Followed successfully!'})
         return Response({'message': 'You cannot follow yourself.'})
 
     def delete(self, request, *args, **kwargs):
         user_to_unfollow = User.objects.get(pk=kwargs['pk'])
         user = request.user
-        user.following.remove(user_to_unfollow)
-        user.num_following -= 1
-        user_to_unfollow.num_followers -= 1
-        user.save()
-        user_to_unfollow.save()
+        with transaction.atomic():
+            follow = User.following.through.objects.filter(
+                from_user=user, to_user=user_to_unfollow).first()
+            if follow is not None:
+                activity.record(
+                    activity.FOLLOW_DELETED, f'follow:{follow.id}:deleted',
+                    user=user.id, followed=user_to_unfollow.id)
+                follow.delete()
         return Response({'message': 'Unfollowed successfully!'})
+
+
+class BulkView(generics.GenericAPIView):
+    """
+    Base view for applying one action to a batch of ids.
+
+    Subclasses set `bulk_action` to a callable taking the user and the list of
+    ids and returning one result per id.
+    """
+    serializer_class = BulkIdsSerializer
+    permission_classes = [IsAuthenticated]
+    bulk_action = None
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['max_items'] = get_max_items()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = self.bulk_action(request.user, serializer.validated_data['ids'])
+        return Response({'results': results})
+
+
+class BulkFollowView(BulkView):
+    """
+    View for following several users with one POST request.
+    """
+    bulk_action = staticmethod(bulk_follow)
+
+
+class BulkLikeView(BulkView):
+    """
+    View for liking several posts with one POST request.
+    """
+    bulk_action = staticmethod(bulk_like)
+
+
+class BulkSavedPostView(BulkView):
+    """
+    View for saving several posts with one POST request.
+    """
+    bulk_action = staticmethod(bulk_save)
+
+
+class CreateUploadView(generics.CreateAPIView):
+    """
+    View for starting a resumable upload of a post file.
+
+    The response carries the id of the upload in its `Location` header;
+    chunks are then sent to that URL with PATCH requests.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def get_success_headers(self, data):
+        return {
+            'Location': reverse('upload-details', kwargs={'pk': data['id']}),
+            'Upload-Offset': '0',
+            'Upload-Length': str(data['length']),
+        }
+
+
+class UploadView(generics.RetrieveDestroyAPIView):
+    """
+    View for resuming, inspecting and cancelling a resumable upload.
+
+    HEAD and GET report the current `Upload-Offset`. PATCH appends the
+    request body, sent as `application/offset+octet-stream`, at the offset
+    given in the `Upload-Offset` header, optionally verified against an
+    `Upload-Checksum` header. Once every byte has arrived the file is
+    attached to the post.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [IsAuthenticated]
+    chunk_content_type = 'application/offset+octet-stream'
+
+    def get_queryset(self):
+        return Upload.objects.filter(user=self.request.user)
+
+    def get_offset_headers(self, upload):
+        return {
+            'Upload-Offset': str(upload.offset),
+            'Upload-Length': str(upload.length),
+            'Cache-Control': 'no-store',
+        }
+
+    def head(self, request, *args, **kwargs):
+        upload = self.get_object()
+        return Response(headers=self.get_offset_headers(upload))
+
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        serializer = self.get_serializer(upload)
+        return Response(serializer.data, headers=self.get_offset_headers(upload))
+
+    def patch(self, request, *args, **kwargs):
+        if request.content_type != self.chunk_content_type:
+            return Response(
+                {'detail': f'Chunks must be sent as {self.chunk_content_type}.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+            checksum = parse_checksum(request.headers.get('Upload-Checksum'))
+        except (KeyError, ValueError):
+            raise ValidationError('A valid Upload-Offset header is required.')
+        except ChecksumMismatch as error:
+            raise ValidationError(str(error))
+
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().filter(
+                pk=self.kwargs['pk']).first()
+            if upload is None:
+                raise Http404
+            if upload.completed is not None or offset != upload.offset:
+                return Response(
+                    {'detail': 'Upload-Offset does not match the upload.'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers=self.get_offset_headers(upload))
+            if upload.offset + size > upload.length:
+                raise ValidationError('The chunk exceeds the upload length.')
+            try:
+                upload.offset = append_chunk(upload, request.stream, size, checksum)
+            except ChecksumMismatch as error:
+                return Response({'detail': str(error)}, status=460)
+            post = None
+            if upload.offset == upload.length:
+                post = assemble(upload)
+                post.media_status = Post.MEDIA_PENDING
+                post.save(update_fields=['file', 'media_status'])
+            upload.save(update_fields=['offset', 'completed'])
+
+        if post is not None:
+            schedule_post_media(post)
+            invalidate_post(post.id)
+        return Response(status=status.HTTP_204_NO_CONTENT,
+                        headers=self.get_offset_headers(upload))
+
+    def perform_destroy(self, instance):
+        discard(instance)
+        instance.delete()
+
+
+class SearchView(generics.ListAPIView):
+    """
+    A view for full-text search over posts or users.
+
+    `q` holds the words to look for and `type` selects `posts` (title and
+    content, the default) or `users` (username and bio). Results are ranked
+    by relevance, best match first. Like the user list, user search is only
+    open to admins.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = SearchPagination
+    serializers = {
+        'posts': PostSerializer,
+        'users': UserSummarySerializer,
+    }
+
+    def get_kind(self):
+        kind = self.request.query_params.get('type', 'posts')
+        if kind not in self.serializers:
+            raise ValidationError(
+                {'type': f'Must be one of: {", ".join(self.serializers)}.'})
+        return kind
+
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        if (self.get_kind() == 'users'
+                and not IsAdminUser().has_permission(request, self)):
+            self.permission_denied(request)
+
+    def get_serializer_class(self):
+        if self.request is None:
+            return PostSerializer
+        return self.serializers[self.get_kind()]
+
+    def list(self, request, *args, **kwargs):
+        kind = self.get_kind()
+        query = request.query_params.get('q', '')
+        model = Post if kind == 'posts' else User
+        results = self.paginator.paginate_results(
+            lambda limit, before: search(kind, query, limit, before),
+            model, request)
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class FollowGraphListView(generics.ListAPIView):
+    """
+    Base view for listing one side of a user's follow graph.
+
+    Pages are read straight from the follow table, newest edge first, so
+    the user's M2M is never loaded as a whole. Subclasses define
+    `get_edges(user_id)` and name the side of each edge to list in
+    `edge_field`.
+    """
+    serializer_class = UserSummarySerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def list(self, request, *args, **kwargs):
+        edges = self.paginate_queryset(self.get_edges(self.kwargs['pk']))
+        users = [getattr(edge, self.edge_field) for edge in edges]
+        serializer = self.get_serializer(users, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class FollowersView(FollowGraphListView):
+    """
+    A view for listing the followers of a user.
+    """
+    edge_field = 'from_user'
+
+    def get_edges(self, user_id):
+        return graph.followers_of(user_id)
+
+
+class FollowingView(FollowGraphListView):
+    """
+    A view for listing the users a user follows.
+    """
+    edge_field = 'to_user'
+
+    def get_edges(self, user_id):
+        return graph.following_of(user_id)
+
+
+class RelationshipView(generics.GenericAPIView):
+    """
+    A view telling whether the authenticated user and another user follow
+    each other.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(graph.relationship(request.user.id, kwargs['pk']))
+
+
+class SuggestionsView(generics.ListAPIView):
+    """
+    A view for friend-of-friend follow suggestions for the authenticated user.
+
+    Each suggested user carries `mutuals`, the number of people the user
+    follows who follow the suggestion.
+    """
+    serializer_class = UserSummarySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, self.max_limit))
+        suggestions = graph.get_suggestions(request.user.id, limit)
+        users = User.objects.in_bulk([user_id for user_id, _ in suggestions])
+        data = []
+        for user_id, mutuals in suggestions:
+            if user_id in users:
+                item = self.get_serializer(users[user_id]).data
+                item['mutuals'] = mutuals
+                data.append(item)
+        return Response(data)
+
+
+class TrendingPostsView(generics.ListAPIView):
+    """
+    A view for the currently trending posts, hottest first.
+
+    The ranking is precomputed by the compute_trending command, so a
+    request only reads a bounded list from the cache.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = None
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, self.max_limit))
+        ranking = get_trending(limit)
+        posts = Post.objects.in_bulk([post_id for post_id, _ in ranking])
+        data = []
+        for post_id, score in ranking:
+            if post_id in posts:
+                item = self.get_serializer(posts[post_id]).data
+                item['score'] = score
+                data.append(item)
+        return Response(data)
+
+
+class ExportView(generics.GenericAPIView):
+    """
+    A view streaming a user's posts, comments, likes and saved posts.
+
+    `output` selects `ndjson` (the default) or `csv`, `types` limits the
+    export to some of `posts`, `comments`, `likes` and `saved_posts`,
+    `gzip=1` compresses it and `media=1` bundles it with the user's media
+    files in a zip archive. Rows are read and sent in chunks, so memory use
+    does not grow with the user's history; under ASGI the chunks are
+    produced asynchronously, since Django would otherwise buffer a sync
+    stream. Only the user and staff may export.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user_id = kwargs['pk']
+        if request.user.id != user_id and not request.user.is_staff:
+            raise PermissionDenied('You can only export your own data.')
+        if not User.objects.filter(pk=user_id).exists():
+            raise Http404
+        output = request.query_params.get('output', export.NDJSON)
+        if output not in export.FORMATS:
+            raise ValidationError(
+                {'output': f'Must be one of: {", ".join(export.FORMATS)}.'})
+        requested = parse_field_list(request, 'types')
+        if requested - set(export.KINDS):
+            raise ValidationError(
+                {'types': f'Must be some of: {", ".join(export.KINDS)}.'})
+        kinds = [kind for kind in export.KINDS if kind in requested]
+        chunks, content_type, filename = export.export(
+            user_id, kinds, output,
+            compress=request.query_params.get('gzip') == '1',
+            media=request.query_params.get('media') == '1')
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.aiter_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from .async_views import APIError, aget_token_user
+from .models import Post
+from .notifications import EventBatch, get_bus, user_channel, post_channel
+
+PATH_RE = re.compile(r'^/ws/(users|posts)/(\d+)/$')
+
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_INTERNAL_ERROR = 1011
+
+
+def get_max_rate():
+    """
+    Return how many messages per second a subscriber receives at most.
+    """
+    return getattr(settings, 'NOTIFICATIONS_MAX_RATE', 5)
+
+
+def get_raw_token(scope):
+    """
+    Read the access token from the `token` query parameter or the
+    Authorization header; browsers cannot set headers on WebSockets.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('token'):
+        return query['token'][0].encode()
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.split()
+            if len(parts) == 2 and parts[0].lower() == b'bearer':
+                return parts[1]
+    return None
+
+
+async def get_channel(scope):
+    """
+    Return the channel a connection subscribes to, or a close code.
+
+    /ws/users/<id>/ is private to that user; /ws/posts/<id>/ is open to any
+    authenticated user.
+    """
+    match = PATH_RE.match(scope['path'])
+    if match is None:
+        return None, CLOSE_NOT_FOUND
+    raw_token = get_raw_token(scope)
+    if raw_token is None:
+        return None, CLOSE_UNAUTHORIZED
+    try:
+        user = await aget_token_user(raw_token)
+    except APIError:
+        return None, CLOSE_UNAUTHORIZED
+    kind, pk = match.group(1), int(match.group(2))
+    if kind == 'users':
+        if pk != user.id:
+            return None, CLOSE_FORBIDDEN
+        return user_channel(pk), None
+    if not await Post.objects.filter(id=pk).aexists():
+        return None, CLOSE_NOT_FOUND
+    return post_channel(pk), None
+
+
+async def websocket_application(scope, receive, send):
+    """
+    Stream notifications of one user or post channel to a WebSocket.
+
+    Events are batched and sent as {"events": [...]} at most
+    NOTIFICATIONS_MAX_RATE times per second, with counter changes merged,
+    so a viral post does not flood its subscribers.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    channel, close_code = await get_channel(scope)
+    if channel is None:
+        await send({'type': 'websocket.close', 'code': close_code})
+        return
+    subscription = await get_bus().subscribe([channel])
+    await send({'type': 'websocket.accept'})
+
+    batch = EventBatch()
+    ready = asyncio.Event()
+    interval = 1 / get_max_rate()
+
+    async def collect():
+        while True:
+            event_channel, event = await subscription.get()
+            batch.add(event_channel, event)
+            ready.set()
+
+    async def flush():
+        while True:
+            await ready.wait()
+            ready.clear()
+            events = batch.drain()
+            if events:
+                await send({'type': 'websocket.send',
+                            'text': json.dumps({'events': events})})
+            await asyncio.sleep(interval)
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+
+    disconnected = asyncio.create_task(wait_disconnect())
+    tasks = [asyncio.create_task(collect()), asyncio.create_task(flush()),
+             disconnected]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await subscription.close()
+    if disconnected.cancelled():
+        # The bus failed; let the client reconnect.
+        await send({'type': 'websocket.close', 'code': CLOSE_INTERNAL_ERROR})
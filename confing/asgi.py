@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'confing.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, since it loads the models.
+from Social_Media.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Route WebSocket connections to the notification streams and everything
+    else to Django.
+    """
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
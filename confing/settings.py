@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -49,6 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Social_Media.metrics.MetricsMiddleware',
+    'Social_Media.throttling.ThrottleMiddleware',
+    'Social_Media.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,12 +86,76 @@ WSGI_APPLICATION = 'confing.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Set DATABASE_ENGINE=postgresql and the DATABASE_* variables for the
+# production primary, and DATABASE_REPLICA_HOSTS to a comma separated list
+# of read replicas. Connections are kept open for DATABASE_CONN_MAX_AGE
+# seconds and health-checked before reuse; put PgBouncer in front of the
+# primary to pool them across processes.
+#
+# Locally, SQLITE_WAL=1 switches SQLite to write-ahead logging and adds a
+# "replica" alias on the same file to exercise the read routing.
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'social_media'),
+            'USER': os.environ.get('DATABASE_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    replica_hosts = [host for host in os.environ.get(
+        'DATABASE_REPLICA_HOSTS', '').split(',') if host]
+    for index, host in enumerate(replica_hosts, start=1):
+        DATABASES[f'replica{index}'] = dict(
+            DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    if os.environ.get('SQLITE_WAL') == '1':
+        DATABASES['replica'] = dict(
+            DATABASES['default'], TEST={'MIRROR': 'default'})
+
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['Social_Media.routers.ReplicaRouter']
+
+# Clients read from the primary for this many seconds after a write.
+REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Post details, comment pages and like pages are cached under a per-post
+# version that is bumped on every write. Set REDIS_URL to share the cache
+# between processes; local memory is used otherwise (and in tests).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
+
+POST_CACHE_ALIAS = 'default'
+POST_CACHE_TIMEOUT = 300
 
 
 # Password validation
@@ -126,14 +194,39 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Media files
+# Uploads are always streamed to a temporary file on disk in chunks instead
+# of being held in memory, and derivatives (thumbnails, video posters and
+# renditions) are generated by a background worker pool.
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+MEDIA_WORKERS = 2
+FFMPEG_BINARY = 'ffmpeg'
+FFMPEG_TIMEOUT = 600
+THUMBNAIL_SIZE = (320, 320)
+AVATAR_THUMBNAIL_SIZE = (96, 96)
+VIDEO_RENDITION_HEIGHT = 720
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Social_Media.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'Social_Media.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # Number of reverse proxies in front of the app. The client address is
+    # taken that many entries from the right of X-Forwarded-For; with 0 the
+    # header is ignored and REMOTE_ADDR is used, so it cannot be spoofed.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -188,3 +281,137 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
+
+# Home timeline: authors with more followers than this are merged into
+# feeds at read time instead of being fanned out on write.
+FEED_FANOUT_THRESHOLD = 10000
+FEED_BACKFILL_SIZE = 50
+
+# Largest number of ids accepted by the bulk follow/like/save endpoints.
+BULK_MAX_ITEMS = 100
+
+# Resumable uploads: partial files are kept here until every chunk arrived.
+# Keep it on the same filesystem as MEDIA_ROOT so finished files are moved
+# into place with a rename instead of being copied. The cleanup_uploads
+# command removes uploads without a chunk for RESUMABLE_UPLOAD_EXPIRY_HOURS.
+RESUMABLE_UPLOAD_DIR = BASE_DIR / 'uploads'
+RESUMABLE_UPLOAD_MAX_SIZE = 5 * 1024 ** 3
+RESUMABLE_UPLOAD_EXPIRY_HOURS = 24
+
+# Follow suggestions: how many candidates are cached per user, and for how
+# long before they are recomputed.
+SUGGESTIONS_SIZE = 100
+SUGGESTIONS_CACHE_TIMEOUT = 3600
+
+# Trending posts: likes and comments from the last TRENDING_WINDOW_HOURS
+# are weighted and halve in value every TRENDING_HALF_LIFE_HOURS. Run the
+# compute_trending command periodically (e.g. every minute from cron). An
+# expired ranking is recomputed in the background while the previous one is
+# served; TRENDING_LOCK_TIMEOUT bounds how long a computation may hold the
+# lock that keeps other processes from starting their own.
+TRENDING_WINDOW_HOURS = 48
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+TRENDING_SIZE = 100
+TRENDING_CACHE_TIMEOUT = 3600
+TRENDING_LOCK_TIMEOUT = 300
+
+# Authenticated users are cached in-process by their token's user id, so
+# most requests skip the User query. Updates and logouts evict the entry in
+# the process that handled them; other processes refresh after the TTL.
+JWT_USER_CACHE_SIZE = 10000
+JWT_USER_CACHE_TTL = 60
+
+# Request metrics are served in the Prometheus format at /metrics to these
+# addresses (None allows everyone). Requests slower than
+# SLOW_REQUEST_THRESHOLD seconds are logged with their SQL; None disables it.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+SLOW_REQUEST_THRESHOLD = os.environ.get('SLOW_REQUEST_THRESHOLD')
+if SLOW_REQUEST_THRESHOLD is not None:
+    SLOW_REQUEST_THRESHOLD = float(SLOW_REQUEST_THRESHOLD)
+
+# Notifications: likes, comments and follows are published to per-user and
+# per-post channels, streamed over WebSockets at /ws/users/<id>/ and
+# /ws/posts/<id>/ by the ASGI app. The "memory" bus only reaches sockets
+# served by the process that handled the write; use "redis" with more than
+# one process. Each socket gets at most NOTIFICATIONS_MAX_RATE batched
+# messages per second, with counter changes merged.
+NOTIFICATIONS_BUS = os.environ.get('NOTIFICATIONS_BUS', 'memory')
+NOTIFICATIONS_REDIS_URL = os.environ.get('REDIS_URL')
+NOTIFICATIONS_MAX_RATE = 5
+NOTIFICATIONS_MAX_PENDING = 100
+
+# Write-behind likes: likes of posts with at least LIKE_BUFFER_THRESHOLD
+# likes are recorded in a buffer ("memory" per process, or "redis" shared)
+# and inserted in bulk every LIKE_FLUSH_INTERVAL seconds by a background
+# thread, with one counter update per post. None inserts every like.
+LIKE_BUFFER_THRESHOLD = None
+LIKE_BUFFER_BACKEND = os.environ.get('LIKE_BUFFER_BACKEND', 'memory')
+LIKE_BUFFER_REDIS_URL = os.environ.get('REDIS_URL')
+LIKE_FLUSH_INTERVAL = 1.0
+
+# Rate limiting: token buckets per URL name and client (user id from a
+# valid access token, otherwise IP address as resolved with
+# REST_FRAMEWORK['NUM_PROXIES']), checked before authentication.
+# "rate" refills the bucket, "burst" is its size (the rate's count by
+# default) and "methods" limits it to some methods. Buckets live in the
+# THROTTLE_CACHE_ALIAS cache, shared between processes when it is Redis.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_BUCKETS = {
+    'register': {'rate': '5/h', 'methods': ['POST']},
+    'token_obtain_pair': {'rate': '10/m', 'methods': ['POST']},
+    'token_refresh': {'rate': '30/m', 'methods': ['POST']},
+    'add-like': {'rate': '120/m', 'burst': 20, 'methods': ['POST']},
+    'async-add-like': {'rate': '120/m', 'burst': 20, 'methods': ['POST']},
+    'comments': {'rate': '30/m', 'burst': 10, 'methods': ['POST']},
+    'async-comments': {'rate': '30/m', 'burst': 10, 'methods': ['POST']},
+    'async-login': {'rate': '10/m', 'methods': ['POST']},
+    'export': {'rate': '10/h'},
+}
+
+# Password hashing: hashes are computed and checked in a pool of
+# PASSWORD_HASH_WORKERS processes (0 hashes inline), so logins and
+# registrations do not hold request workers on CPU. Past
+# PASSWORD_HASH_MAX_PENDING queued hashes, logins are refused with a 503.
+# PASSWORD_HASH_ITERATIONS sets the PBKDF2 cost (None keeps Django's);
+# stored hashes are upgraded on the next login after it changes.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = 16
+PASSWORD_HASH_ITERATIONS = os.environ.get('PASSWORD_HASH_ITERATIONS')
+if PASSWORD_HASH_ITERATIONS is not None:
+    PASSWORD_HASH_ITERATIONS = int(PASSWORD_HASH_ITERATIONS)
+PASSWORD_HASHERS = [
+    'Social_Media.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+AUTHENTICATION_BACKENDS = ['Social_Media.authentication.PooledModelBackend']
+
+# Activity log: counter updates, feed fan-out, suggestion updates and
+# notifications of likes, comments, follows and posts are recorded in the
+# Activity table with the write and applied in batches of
+# ACTIVITY_BATCH_SIZE; the counter deltas of a batch are summed per row
+# into one UPDATE each, which is how engagement counters are written. The "thread" worker drains the log from
+# ACTIVITY_THREADS background threads of each process (0 applies events
+# inline on commit); with "process" run the process_activity command as a
+# separate process instead. On SQLite use only one of them. Failed events
+# are retried after ACTIVITY_RETRY_DELAY seconds, doubled per attempt, up
+# to ACTIVITY_MAX_ATTEMPTS times. process_activity deletes events processed
+# more than ACTIVITY_RETENTION_DAYS ago; their keys stop deduplicating
+# replayed writes, so keep it longer than any client or job retries.
+ACTIVITY_WORKER = os.environ.get('ACTIVITY_WORKER', 'thread')
+ACTIVITY_THREADS = 1
+ACTIVITY_BATCH_SIZE = 100
+ACTIVITY_POLL_INTERVAL = 1.0
+ACTIVITY_RETRY_DELAY = 1.0
+ACTIVITY_MAX_ATTEMPTS = 5
+ACTIVITY_RETENTION_DAYS = 7
+
+# Data exports stream a user's rows as NDJSON or CSV from
+# /api/users/<id>/export/ and the export_user_data command, reading
+# EXPORT_CHUNK_SIZE rows from the database at a time.
+EXPORT_CHUNK_SIZE = 2000